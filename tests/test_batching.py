@@ -114,6 +114,33 @@ class TestBatchingMechanism:
         assert len(batches) == 1
         assert batches[0] == variables
     
+    def test_create_batches_skips_repeated_values(self):
+        """Test that repeated values do not produce extra batches."""
+        variables = {
+            'ar': ['2020', '2021', '2022', '2020', '2021', '2022', '2023'],
+            'nyregunder': ''
+        }
+        
+        batches = self.client._create_batches(variables, show_progress=False)
+        
+        # 4 distinct years fit in a single batch of 5
+        assert len(batches) == 1
+        assert batches[0]['ar'] == ['2020', '2021', '2022', '2023']
+    
+    def test_iter_batches_is_lazy(self):
+        """Test that batches are generated one at a time and share other variables."""
+        variables = {
+            'ar': [str(year) for year in range(2000, 2012)],
+            'nyregunder': ''
+        }
+        
+        batches = self.client._iter_batches(variables, 'ar')
+        first = next(batches)
+        
+        assert first == {'ar': ['2000', '2001', '2002', '2003', '2004'], 'nyregunder': ''}
+        assert [batch['ar'][0] for batch in batches] == ['2005', '2010']
+        assert variables['ar'][0] == '2000'
+    
     def test_batch_size_configuration(self):
         """Test that batch size can be configured."""
         # Change batch size
@@ -295,6 +322,60 @@ class TestBatchingRetrieval:
         assert len(df) == 1
         assert df.iloc[0]['ar'] == '2020'
     
+    @patch.object(TrafikanalysClient, '_get_data')
+    def test_concurrent_batches_keep_order(self, mock_get_data):
+        """Test that concurrently fetched batches are combined in batch order."""
+        import threading
+        
+        # All three batches must be in flight at once to get past the barrier
+        barrier = threading.Barrier(3, timeout=5)
+        
+        def side_effect(query):
+            barrier.wait()
+            years = query.split('|')[1].split(':')[1].split(',')
+            return {'Rows': [
+                {'Cell': [{'Column': 'ar', 'Value': year}]} for year in years
+            ]}
+        
+        mock_get_data.side_effect = side_effect
+        self.client.configure_batching(max_batch_size=3, max_workers=4)
+        
+        years = [str(year) for year in range(2015, 2024)]
+        df = self.client.get_data_as_dataframe(
+            'test_product',
+            {'ar': years, 'nyregunder': ''},
+            show_progress=False
+        )
+        
+        assert mock_get_data.call_count == 3
+        assert list(df['ar']) == years
+        assert self.client.get_batching_info()['max_workers'] == 4
+    
+    def test_concurrent_batches_read_cache_inline(self):
+        """Test that cached batches are not dispatched to worker threads."""
+        import threading
+        
+        self.client.configure_batching(max_batch_size=3, max_workers=4)
+        cached_query = self.client._build_query('test_product', {'ar': ['2015', '2016', '2017'], 'nyregunder': ''})
+        fetch_threads = {}
+        
+        def get_data(query):
+            fetch_threads[query] = threading.current_thread()
+            years = query.split('|')[1].split(':')[1].split(',')
+            return {'Rows': [{'Cell': [{'Column': 'ar', 'Value': year}]} for year in years]}
+        
+        with patch.object(self.client, '_is_data_cached', side_effect=lambda query: query == cached_query), \
+             patch.object(self.client, '_get_data', side_effect=get_data):
+            df = self.client.get_data_as_dataframe(
+                'test_product',
+                {'ar': [str(year) for year in range(2015, 2024)], 'nyregunder': ''},
+                show_progress=False
+            )
+        
+        assert len(df) == 9
+        assert fetch_threads[cached_query] is threading.current_thread()
+        assert sum(t is not threading.current_thread() for t in fetch_threads.values()) == 2
+    
     @patch.object(TrafikanalysClient, '_get_data')
     def test_duplicate_removal_in_batches(self, mock_get_data):
         """Test that duplicate rows are removed when combining batches."""
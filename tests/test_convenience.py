@@ -11,6 +11,7 @@ This test file focuses on:
 
 import pytest
 import pandas as pd
+import os
 import time
 import tempfile
 import shutil
@@ -90,18 +91,63 @@ class TestAdvancedQueryBuilding:
             assert query_dict["reglan"] == ["01"]
             assert query_dict["drivmedel"] == "101"
             assert query_dict["bestand"] == ""
-    
+
+    def test_build_query_fetches_concurrently(self):
+        """Test that several 'all' variables are fetched at the same time."""
+        import threading
+
+        # Each lookup waits for the other, so this only passes if they overlap
+        barrier = threading.Barrier(2, timeout=5)
+
+        def get_values(product, var):
+            barrier.wait()
+            return [f"{var}_1", f"{var}_2"]
+
+        with patch.object(self.client, 'get_all_available_values', side_effect=get_values):
+            query_dict = self.client.build_query("t10016", ar="all", bestand="", drivmedel="all")
+
+        assert list(query_dict) == ["ar", "bestand", "drivmedel"]
+        assert query_dict["ar"] == ["ar_1", "ar_2"]
+        assert query_dict["drivmedel"] == ["drivmedel_1", "drivmedel_2"]
+
+    def test_async_build_query(self):
+        """Test building query asynchronously with several 'all' values."""
+        import asyncio
+
+        with patch.object(self.client, 'get_all_available_values') as mock_get_values:
+            mock_get_values.side_effect = lambda product, var, exclude_totals=True: {
+                "ar": ["2020", "2021"],
+                "drivmedel": ["101", "102"]
+            }.get(var, [])
+
+            query_dict = asyncio.run(self.client.a_build_query(
+                "t10016",
+                ar="all",
+                drivmedel="all",
+                reglan=["01"],
+                bestand=""
+            ))
+
+            assert query_dict == {
+                "ar": ["2020", "2021"],
+                "drivmedel": ["101", "102"],
+                "reglan": ["01"],
+                "bestand": ""
+            }
+            assert list(query_dict) == ["ar", "drivmedel", "reglan", "bestand"]
+            assert mock_get_values.call_count == 2
+
     def test_get_all_available_values_year_sorting(self):
         """Test that years are properly sorted."""
-        mock_options = pd.DataFrame([
+        mock_options = [
             {"name": "2022", "label": "2022", "option_type": "Value"},
             {"name": "2020", "label": "2020", "option_type": "Value"},
             {"name": "2021", "label": "2021", "option_type": "Value"},
             {"name": "t1", "label": "Totalt", "option_type": "Value"},
             {"name": "senaste", "label": "Senaste", "option_type": "Filter"}
-        ])
+        ]
         
-        with patch.object(self.client, 'explore_variable_options') as mock_explore:
+        with patch.object(self.client, '_collect_variable_options') as mock_explore:
             mock_explore.return_value = mock_options
             
             values = self.client.get_all_available_values("t10016", "ar")
@@ -109,16 +155,31 @@ class TestAdvancedQueryBuilding:
             # Should be sorted and exclude totals and filters
             assert values == ["2020", "2021", "2022"]
     
+    def test_get_all_available_values_non_year_names(self):
+        """Test that only four-digit names are kept as years."""
+        mock_options = [
+            {"name": "2019", "label": "2019", "option_type": "Value"},
+            {"name": "forra", "label": "Förra", "option_type": "Filter"},
+            {"name": "20181", "label": "20181", "option_type": "Value"},
+            {"name": "201", "label": "201", "option_type": "Value"},
+            {"name": "2018", "label": "2018", "option_type": "Value"}
+        ]
+        
+        with patch.object(self.client, '_collect_variable_options') as mock_explore:
+            mock_explore.return_value = mock_options
+            
+            assert self.client.get_all_available_values("t10016", "ar") == ["2018", "2019"]
+    
     def test_get_all_available_values_exclude_totals(self):
         """Test excluding total values."""
-        mock_options = pd.DataFrame([
+        mock_options = [
             {"name": "101", "label": "Bensin", "option_type": "Value"},
             {"name": "102", "label": "Diesel", "option_type": "Value"},
             {"name": "t1", "label": "Totalt", "option_type": "Value"},
             {"name": "totalt", "label": "Totalt", "option_type": "Value"}
-        ])
+        ]
         
-        with patch.object(self.client, 'explore_variable_options') as mock_explore:
+        with patch.object(self.client, '_collect_variable_options') as mock_explore:
             mock_explore.return_value = mock_options
             
             # With exclude_totals=True (default)
@@ -132,10 +193,75 @@ class TestAdvancedQueryBuilding:
             assert "t1" in values_with_totals
             assert "totalt" in values_with_totals
     
+    @staticmethod
+    def _fuel_structure(names):
+        """Build a product structure whose 'drivmedel' variable has the given values."""
+        return {
+            "StructureItems": [
+                {
+                    "Name": "t10016",
+                    "Type": "P",
+                    "StructureItems": [
+                        {
+                            "Name": "drivmedel",
+                            "Type": "D",
+                            "StructureItems": [
+                                {"Name": name, "Label": name, "Type": "DV"} for name in names
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+    
+    def test_get_all_available_values_memoized(self):
+        """Test that values are looked up once per variable until the memory cache is cleared."""
+        with patch.object(self.client, '_make_request',
+                          return_value=self._fuel_structure(["101", "t1"])), \
+             patch.object(self.client, '_collect_variable_options',
+                          wraps=self.client._collect_variable_options) as mock_explore:
+            first = self.client.get_all_available_values("t10016", "drivmedel")
+            first.append("changed")
+            assert self.client.get_all_available_values("t10016", "drivmedel") == ["101"]
+            assert mock_explore.call_count == 1
+            
+            # Other settings are looked up separately
+            assert self.client.get_all_available_values(
+                "t10016", "drivmedel", exclude_totals=False
+            ) == ["101", "t1"]
+            assert mock_explore.call_count == 2
+            
+            self.client.clear_memory_cache()
+            self.client.get_all_available_values("t10016", "drivmedel")
+            assert mock_explore.call_count == 3
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_get_all_available_values_expire_with_cache(self, mock_request):
+        """Test that remembered values are dropped once their structure's cache entry expires."""
+        mock_request.return_value = self._fuel_structure(["101"])
+        assert self.client.get_all_available_values("t10016", "drivmedel") == ["101"]
+        
+        mock_request.return_value = self._fuel_structure(["101", "102"])
+        assert self.client.get_all_available_values("t10016", "drivmedel") == ["101"]
+        assert mock_request.call_count == 1
+        
+        # Expire every cache entry: the values must not outlive the responses
+        self.client.cache.clear_memory()
+        for name in os.listdir(self.temp_dir):
+            os.utime(os.path.join(self.temp_dir, name), (0, 0))
+        
+        assert self.client.get_all_available_values("t10016", "drivmedel") == ["101", "102"]
+        assert self.client.build_query("t10016", drivmedel="all")["drivmedel"] == ["101", "102"]
+        
+        # Nor are they used once caching is switched off
+        self.client.cache.enabled = False
+        mock_request.return_value = self._fuel_structure(["103"])
+        assert self.client.get_all_available_values("t10016", "drivmedel") == ["103"]
+    
     def test_get_all_available_values_empty_options(self):
         """Test handling of empty options."""
-        with patch.object(self.client, 'explore_variable_options') as mock_explore:
-            mock_explore.return_value = pd.DataFrame()
+        with patch.object(self.client, '_collect_variable_options') as mock_explore:
+            mock_explore.return_value = []
             
             values = self.client.get_all_available_values("t10016", "nonexistent")
             assert values == []
@@ -218,6 +344,25 @@ class TestVariableExploration:
         assert hierarchy_info['agarkat'] == 'agare'  # Child of agare hierarchy
         assert pd.isna(hierarchy_info['bestand'])  # No parent
     
+    @patch('trafapy.client.TrafikanalysClient._get_structure')
+    def test_explore_product_variables_deep_hierarchy(self, mock_get_structure):
+        """Test that deeply nested hierarchies are walked without recursion limits."""
+        depth = 2000
+        node = {"Name": "leaf", "Label": "Leaf", "Type": "D"}
+        for level in reversed(range(depth)):
+            node = {"Name": f"h{level}", "Label": f"H{level}", "Type": "H", "StructureItems": [node]}
+
+        mock_get_structure.return_value = {
+            "StructureItems": [{"Name": "t10016", "Type": "P", "StructureItems": [node]}]
+        }
+
+        variables_df = self.client.explore_product_variables("t10016")
+
+        assert len(variables_df) == depth + 1
+        assert list(variables_df["name"][:3]) == ["h0", "h1", "h2"]
+        assert variables_df.iloc[-1]["name"] == "leaf"
+        assert variables_df.iloc[-1]["parent_hierarchy"] == f"h{depth - 1}"
+
     @patch('trafapy.client.TrafikanalysClient._make_request')
     def test_explore_variable_options_direct_access(self, mock_request):
         """Test exploring variable options with direct access."""
@@ -295,11 +440,11 @@ class TestVariableExploration:
             }
         ]
         
-        with patch.object(self.client, '_explore_variable_options_hierarchical') as mock_hierarchical:
-            mock_hierarchical.return_value = pd.DataFrame([
+        with patch.object(self.client, '_collect_variable_options_hierarchical') as mock_hierarchical:
+            mock_hierarchical.return_value = [
                 {"name": "10", "label": "Fysisk person", "option_type": "Value"},
                 {"name": "20", "label": "Juridisk person", "option_type": "Value"}
-            ])
+            ]
             
             options_df = self.client.explore_variable_options("t10016", "agarkat")
             
@@ -307,6 +452,223 @@ class TestVariableExploration:
             assert "10" in options_df["name"].values
             assert "20" in options_df["name"].values
 
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_explore_variable_options_from_product_structure(self, mock_request):
+        """Test that options included in the product structure need no extra request."""
+        mock_request.return_value = {
+            "StructureItems": [
+                {
+                    "Name": "t10016",
+                    "Type": "P",
+                    "StructureItems": [
+                        {
+                            "Name": "ar",
+                            "Type": "D",
+                            "StructureItems": [
+                                {"Name": "2020", "Label": "2020", "Type": "DV"},
+                                {"Name": "2021", "Label": "2021", "Type": "DV"}
+                            ]
+                        },
+                        {"Name": "bestand", "Type": "M"}
+                    ]
+                }
+            ]
+        }
+        
+        self.client.explore_product_variables("t10016")
+        options_df = self.client.explore_variable_options("t10016", "ar")
+        
+        assert list(options_df["name"]) == ["2020", "2021"]
+        assert mock_request.call_count == 1
+    
+    @staticmethod
+    def _year_structure(years, label="Year"):
+        """Build a product structure whose 'ar' variable includes the given years."""
+        return {
+            "StructureItems": [
+                {
+                    "Name": "t10016",
+                    "Type": "P",
+                    "StructureItems": [
+                        {
+                            "Name": "ar",
+                            "Type": "D",
+                            "StructureItems": [
+                                {"Name": year, "Label": f"{label} {year}", "Type": "DV"}
+                                for year in years
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_product_structure_index_not_kept_without_cache(self, mock_request):
+        """Test that with caching disabled, options are always looked up again."""
+        client = TrafikanalysClient(cache_enabled=False)
+        mock_request.return_value = self._year_structure(["2020"])
+        client.explore_product_variables("t10016")
+        
+        mock_request.return_value = self._year_structure(["2021"])
+        
+        assert list(client.explore_variable_options("t10016", "ar")["name"]) == ["2021"]
+        assert client.get_all_available_values("t10016", "ar") == ["2021"]
+        assert client._hierarchy_paths == {}
+        assert client._variable_options == {}
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_product_structure_index_per_language(self, mock_request):
+        """Test that options indexed in one language are not returned in another."""
+        def respond(url, params, validators=None):
+            return self._year_structure(["2020"], label="År" if params["lang"] == "sv" else "Year")
+        
+        mock_request.side_effect = respond
+        
+        self.client.explore_product_variables("t10016")
+        self.client.language = "en"
+        options_df = self.client.explore_variable_options("t10016", "ar")
+        
+        assert list(options_df["label"]) == ["Year 2020"]
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_product_structure_index_expires_with_cache(self, mock_request):
+        """Test that the index is dropped once the structure's cache entry expires."""
+        mock_request.return_value = self._year_structure(["2020"])
+        self.client.explore_product_variables("t10016")
+        
+        mock_request.return_value = self._year_structure(["2021"])
+        assert list(self.client.explore_variable_options("t10016", "ar")["name"]) == ["2020"]
+        assert mock_request.call_count == 1
+        
+        # Expire every cache entry: the index must not outlive the responses
+        self.client.cache.clear_memory()
+        for name in os.listdir(self.temp_dir):
+            os.utime(os.path.join(self.temp_dir, name), (0, 0))
+        
+        assert list(self.client.explore_variable_options("t10016", "ar")["name"]) == ["2021"]
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_explore_variable_options_reuses_hierarchy_paths(self, mock_request):
+        """Test that the product structure is walked once for nested variables."""
+        product_structure = {
+            "StructureItems": [
+                {
+                    "Name": "t10016",
+                    "Type": "P",
+                    "StructureItems": [
+                        {
+                            "Name": "agare",
+                            "Type": "H",
+                            "StructureItems": [
+                                {"Name": "agarkat", "Type": "D"},
+                                {"Name": "kon", "Type": "D"}
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+        
+        def respond(url, params, validators=None):
+            query = params.get("query")
+            if query == "t10016":
+                return product_structure
+            if query.startswith("t10016|agare|"):
+                name = query.rsplit("|", 1)[1]
+                return {"StructureItems": [
+                    {"Name": name, "Type": "D", "StructureItems": [{"Name": "1", "Type": "DV"}]}
+                ]}
+            return {"StructureItems": []}
+        
+        mock_request.side_effect = respond
+        
+        self.client.explore_variable_options("t10016", "agarkat")
+        options_df = self.client.explore_variable_options("t10016", "kon")
+        
+        assert list(options_df["name"]) == ["1"]
+        queries = [call.args[1]["query"] for call in mock_request.call_args_list]
+        assert queries == ["t10016|agarkat", "t10016", "t10016|agare|agarkat", "t10016|agare|kon"]
+
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_explore_variable_options_remembers_lookups(self, mock_request):
+        """Test that a variable's options are found in its response only once."""
+        mock_request.return_value = {"StructureItems": [
+            {"Name": "ar", "Type": "D", "StructureItems": [{"Name": "2020", "Type": "DV"}]}
+        ]}
+        
+        first = self.client.explore_variable_options("t10016", "ar")
+        
+        with patch.object(self.client, '_find_variable_item') as mock_find:
+            second = self.client.explore_variable_options("t10016", "ar")
+        
+        mock_find.assert_not_called()
+        assert list(first["name"]) == list(second["name"]) == ["2020"]
+        assert mock_request.call_count == 1
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_hierarchical_fallback_uses_product_structure_options(self, mock_request):
+        """Test that options found in the product structure skip the hierarchical request."""
+        product_structure = {
+            "StructureItems": [
+                {
+                    "Name": "t10016",
+                    "Type": "P",
+                    "StructureItems": [
+                        {
+                            "Name": "agare",
+                            "Type": "H",
+                            "StructureItems": [
+                                {"Name": "kon", "Type": "D", "StructureItems": [
+                                    {"Name": "1", "Label": "Kvinna", "Type": "DV"}
+                                ]}
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+        
+        def respond(url, params, validators=None):
+            if params.get("query") == "t10016":
+                return product_structure
+            return {"StructureItems": []}
+        
+        mock_request.side_effect = respond
+        
+        options_df = self.client.explore_variable_options("t10016", "kon")
+        
+        assert list(options_df["name"]) == ["1"]
+        queries = [call.args[1]["query"] for call in mock_request.call_args_list]
+        assert queries == ["t10016|kon", "t10016"]
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_hierarchical_fallback_without_cache_requests_options(self, mock_request):
+        """Test that with caching disabled the fallback does not reuse earlier options."""
+        client = TrafikanalysClient(cache_enabled=False)
+        current = {"option": "1"}
+        
+        def respond(url, params, validators=None):
+            query = params.get("query")
+            kon = {"Name": "kon", "Type": "D", "StructureItems": [
+                {"Name": current["option"], "Type": "DV"}
+            ]}
+            if query == "t10016":
+                return {"StructureItems": [{
+                    "Name": "t10016", "Type": "P",
+                    "StructureItems": [{"Name": "agare", "Type": "H", "StructureItems": [kon]}]
+                }]}
+            if query == "t10016|agare|kon":
+                return {"StructureItems": [kon]}
+            return {"StructureItems": []}
+        
+        mock_request.side_effect = respond
+        
+        assert list(client.explore_variable_options("t10016", "kon")["name"]) == ["1"]
+        
+        current["option"] = "2"
+        assert list(client.explore_variable_options("t10016", "kon")["name"]) == ["2"]
 
 class TestDataProcessing:
     """Test data processing and conversion."""
@@ -391,6 +753,29 @@ class TestDataProcessing:
         # Check that missing values are handled properly
         assert df.iloc[1]["antal"] != df.iloc[1]["antal"]  # NaN check
         assert df.iloc[0]["region"] != df.iloc[0]["region"]  # NaN check
+    
+    def test_get_data_as_dataframe_categorical(self):
+        """Test opt-in conversion of repeated values to category dtype."""
+        rows = [
+            {"Cell": [
+                {"Column": "ar", "Value": str(2000 + i % 3)},
+                {"Column": "antal", "Value": str(i)}
+            ]}
+            for i in range(100)
+        ]
+        
+        with patch.object(self.client, '_get_data', return_value={"Rows": rows}):
+            df = self.client.get_data_as_dataframe(
+                "t10016", {"ar": "", "antal": ""}, show_progress=False, categorical=True
+            )
+            plain_df = self.client.get_data_as_dataframe(
+                "t10016", {"ar": "", "antal": ""}, show_progress=False
+            )
+        
+        assert isinstance(df["ar"].dtype, pd.CategoricalDtype)
+        assert not isinstance(df["antal"].dtype, pd.CategoricalDtype)
+        assert not isinstance(plain_df["ar"].dtype, pd.CategoricalDtype)
+        assert list(df["ar"].astype(str)) == list(plain_df["ar"])
 
 
 class TestCachePerformance:
@@ -767,7 +1152,7 @@ class TestRealWorldUsagePatterns:
                     # Subsequent calls succeed
                     mock_response = Mock()
                     mock_response.status_code = 200
-                    mock_response.json.return_value = {"StructureItems": []}
+                    mock_response.content = b'{"StructureItems": []}'
                     return mock_response
             
             mock_get.side_effect = side_effect
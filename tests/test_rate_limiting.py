@@ -8,11 +8,12 @@ in the TrafikanalysClient.
 import pytest
 import time
 import requests
+from collections import deque
 from unittest.mock import Mock, patch, MagicMock
 from typing import Dict, Any
 
 # Assuming the client module structure from the provided code
-from trafapy.client import RateLimiter, TrafikanalysClient
+from trafapy.client import RateLimiter, TrafikanalysClient, rate_limit
 
 
 class TestRateLimiter:
@@ -27,7 +28,7 @@ class TestRateLimiter:
         assert limiter.backoff_factor == 2.0
         assert limiter.max_retries == 3
         assert limiter.min_interval == 1.0
-        assert limiter.call_times == []
+        assert list(limiter.call_times) == []
         
         # Custom initialization
         limiter = RateLimiter(
@@ -99,17 +100,17 @@ class TestRateLimiter:
         limiter = RateLimiter(calls_per_second=2.0)
         
         # Add some old call times manually
-        current_time = time.time()
-        limiter.call_times = [
+        current_time = time.monotonic()
+        limiter.call_times = deque([
             current_time - 2.0,  # Should be cleaned up
             current_time - 0.5,  # Should remain
-        ]
+        ])
         
         limiter.wait_if_needed()
         
         # Only recent calls should remain
         assert len(limiter.call_times) == 2  # 1 old + 1 new
-        assert all(current_time - call_time <= 1.0 for call_time in limiter.call_times[:-1])
+        assert all(current_time - call_time <= 1.0 for call_time in list(limiter.call_times)[:-1])
     
     def test_execute_with_retry_success(self):
         """Test successful execution without retries."""
@@ -201,6 +202,103 @@ class TestRateLimiter:
             limiter.execute_with_retry(mock_func, debug=False)
         
         assert mock_func.call_count == 1  # No retries for client errors
+    
+    def test_execute_with_retry_honors_retry_after(self):
+        """Test that a Retry-After header replaces the default backoff."""
+        limiter = RateLimiter(calls_per_second=10.0, max_retries=1)
+        
+        mock_response = Mock()
+        mock_response.status_code = 429
+        mock_response.headers = {'Retry-After': '0.2'}
+        
+        mock_error = requests.exceptions.RequestException("Rate limited")
+        mock_error.response = mock_response
+        
+        mock_func = Mock(side_effect=[mock_error, "success"])
+        
+        start_time = time.time()
+        result = limiter.execute_with_retry(mock_func, debug=False)
+        elapsed = time.time() - start_time
+        
+        assert result == "success"
+        # Waited the 0.2 seconds asked for instead of the 2 second default
+        assert 0.15 <= elapsed < 1.5
+    
+    def test_retry_after_http_date(self):
+        """Test parsing Retry-After given as an HTTP date."""
+        from email.utils import formatdate
+        
+        limiter = RateLimiter()
+        response = Mock()
+        response.headers = {'Retry-After': formatdate(time.time() + 30, usegmt=True)}
+        
+        assert 25 <= limiter._retry_after(response) <= 30
+        
+        response.headers = {'Retry-After': '3600'}
+        assert limiter._retry_after(response) == limiter.MAX_SERVER_WAIT
+        
+        response.headers = {}
+        assert limiter._retry_after(response) is None
+    
+    def test_update_from_headers_pauses_when_exhausted(self):
+        """Test that calls wait for the reset when the server's limit is used up."""
+        limiter = RateLimiter(calls_per_second=100.0, burst_size=10)
+        
+        # Plenty left: no pause
+        limiter.update_from_headers({'X-RateLimit-Remaining': '50', 'X-RateLimit-Reset': '5'})
+        start_time = time.time()
+        limiter.wait_if_needed()
+        assert time.time() - start_time < 0.1
+        
+        # Exhausted: the next call waits for the reset
+        limiter.update_from_headers({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0.3'})
+        start_time = time.time()
+        limiter.wait_if_needed()
+        assert time.time() - start_time >= 0.25
+
+    
+    def test_burst_limit_adapts_to_overload(self):
+        """Test that 429 responses halve the burst limit and successes restore it."""
+        limiter = RateLimiter(calls_per_second=100.0, burst_size=8, max_retries=1)
+        
+        mock_response = Mock()
+        mock_response.status_code = 429
+        mock_response.headers = {'Retry-After': '0'}
+        mock_error = requests.exceptions.RequestException("Rate limited")
+        mock_error.response = mock_response
+        
+        limiter.execute_with_retry(Mock(side_effect=[mock_error, "success"]))
+        assert limiter.burst_limit == 4.5  # halved, then one additive step
+        
+        for _ in range(10):
+            limiter.execute_with_retry(Mock(return_value="success"))
+        assert limiter.burst_limit == 8.0  # never above burst_size
+    
+    def test_burst_limit_shrinks_for_slow_calls(self):
+        """Test that calls slower than the latency target reduce the burst limit."""
+        limiter = RateLimiter(calls_per_second=100.0, burst_size=8, latency_target=0.5)
+        
+        limiter._record_success(1.0)
+        assert limiter.burst_limit == 4.0
+        
+        limiter._record_success(1.0)
+        limiter._record_success(1.0)
+        limiter._record_success(1.0)
+        assert limiter.burst_limit == 1.0  # never below one call
+    
+    def test_rate_limit_decorator_per_function(self):
+        """Test that the rate_limit decorator spaces calls of each function separately."""
+        limit = rate_limit(calls_per_second=10.0)
+        first = limit(Mock(return_value=1))
+        second = limit(Mock(return_value=2))
+        
+        start_time = time.monotonic()
+        assert first() == 1
+        assert second() == 2  # separate interval: no wait
+        assert time.monotonic() - start_time < 0.05
+        
+        assert first() == 1
+        assert time.monotonic() - start_time >= 0.09
 
 
 class TestTrafikanalysClientRateLimiting:
@@ -288,7 +386,7 @@ class TestTrafikanalysClientRateLimiting:
         # Setup mock response
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"test": "data"}
+        mock_response.content = b'{"test": "data"}'
         mock_get.return_value = mock_response
         
         client = TrafikanalysClient(
@@ -316,7 +414,7 @@ class TestTrafikanalysClientRateLimiting:
         # Setup mock response
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"test": "data"}
+        mock_response.content = b'{"test": "data"}'
         mock_get.return_value = mock_response
         
         client = TrafikanalysClient(rate_limit_enabled=False)
@@ -338,7 +436,7 @@ class TestTrafikanalysClientRateLimiting:
         
         mock_response_success = Mock()
         mock_response_success.status_code = 200
-        mock_response_success.json.return_value = {"test": "data"}
+        mock_response_success.content = b'{"test": "data"}'
         
         mock_error = requests.exceptions.RequestException("Rate limited")
         mock_error.response = mock_response_error
@@ -17,10 +17,13 @@ import json
 import os
 import tempfile
 import shutil
+import requests
 from unittest.mock import Mock, patch, MagicMock
 from typing import Dict, Any
 
 # Import the modules we're testing
+import trafapy.cache_utils
+import trafapy.client
 from trafapy.client import TrafikanalysClient
 from trafapy.cache_utils import APICache, cached_api_request
 
@@ -59,6 +62,19 @@ class TestAPICache:
         params_different = {"lang": "en", "query": "t10016"}
         key3 = self.cache.generate_cache_key(url, params_different)
         assert key1 != key3
+
+    def test_cache_key_encoding(self):
+        """Test that keys hash the URL and compact, key-sorted JSON of the parameters."""
+        import hashlib
+        from datetime import date
+        url = "https://api.trafa.se/api/data"
+        params = {"query": "t10016|ar:2020", "lang": "sv", "since": date(2020, 1, 31), "page": 2}
+
+        payload = b'{"lang":"sv","page":2,"query":"t10016|ar:2020","since":"2020-01-31"}'
+        expected = hashlib.md5(url.encode('utf-8') + b'?' + payload).hexdigest()
+
+        # Values JSON cannot encode natively are keyed by their string form
+        assert self.cache.generate_cache_key(url, params) == expected
     
     def test_cache_save_and_retrieve(self):
         """Test saving and retrieving from cache."""
@@ -108,7 +124,121 @@ class TestAPICache:
         # Retrieve should return None when disabled
         retrieved_data = disabled_cache.get_from_cache(cache_key)
         assert retrieved_data == None
-    
+
+    def test_cache_large_file_roundtrip(self):
+        """Test that large (memory-mapped) cache files are read back correctly."""
+        cache_key = "test_large"
+        test_data = {"Rows": [{"Cell": [{"Column": "ar", "Value": str(i)}]} for i in range(2000)]}
+
+        self.cache.save_to_cache(cache_key, test_data)
+        assert os.path.getsize(self.cache.get_cache_path(cache_key)) >= 16 * 1024
+
+        # A fresh instance has an empty memory tier and reads the file
+        reader = APICache(cache_dir=self.temp_dir, expiry_seconds=3600, enabled=True)
+        assert reader.get_from_cache(cache_key) == test_data
+
+    def test_cache_rewrite_during_mapped_read(self):
+        """Test that rewriting an entry does not truncate a file that is being read."""
+        orjson = trafapy.cache_utils.orjson
+        if orjson is None:
+            pytest.skip("cache files are only memory-mapped with orjson")
+
+        cache_key = "test_rewrite"
+        old_data = {"Rows": [{"Cell": [{"Column": "ar", "Value": str(i)}]} for i in range(2000)]}
+        new_data = {"Rows": []}
+        self.cache.save_to_cache(cache_key, old_data, validators={"etag": '"v1"'})
+
+        # Another client rewrites the entry while the mapped file is being parsed
+        writer = APICache(cache_dir=self.temp_dir, expiry_seconds=3600, enabled=True)
+        loads = orjson.loads
+        def loads_during_rewrite(content):
+            if isinstance(content, memoryview):
+                writer.save_to_cache(cache_key, new_data, validators={"etag": '"v2"'})
+            return loads(content)
+
+        reader = APICache(cache_dir=self.temp_dir, expiry_seconds=3600, enabled=True)
+        with patch.object(orjson, 'loads', side_effect=loads_during_rewrite):
+            assert reader.get_from_cache(cache_key) == old_data
+
+        # The rewrite itself is complete and leaves no temporary files behind
+        assert APICache(cache_dir=self.temp_dir, enabled=True).get_from_cache(cache_key) == new_data
+        assert reader.get_validators(cache_key) == {"etag": '"v2"'}
+        assert not [f for f in os.listdir(self.temp_dir) if f.endswith('.tmp')]
+
+    def test_cache_read_without_orjson(self):
+        """Test that cache reads fall back to the standard json module."""
+        cache_key = "test_stdlib"
+        test_data = {"test": "åäö", "number": 123}
+        self.cache.save_to_cache(cache_key, test_data)
+
+        reader = APICache(cache_dir=self.temp_dir, expiry_seconds=3600, enabled=True)
+        with patch('trafapy.cache_utils.orjson', None):
+            assert reader.get_from_cache(cache_key) == test_data
+
+    def test_cache_memory_tier(self):
+        """Test that saved entries are served from memory until the cache is cleared."""
+        cache_key = "test_memory"
+        test_data = {"test": "memory"}
+        self.cache.save_to_cache(cache_key, test_data)
+
+        # Served from memory even without the file
+        os.remove(self.cache.get_cache_path(cache_key))
+        assert self.cache.get_from_cache(cache_key) == test_data
+
+        self.cache.clear_cache()
+        assert self.cache.get_from_cache(cache_key) is None
+
+    def test_cache_memory_tier_bounded(self):
+        """Test that the memory tier evicts the least recently used entries."""
+        cache = APICache(cache_dir=self.temp_dir, expiry_seconds=3600, enabled=True, memory_size=2)
+        for i in range(3):
+            cache.save_to_cache(f"key{i}", {"i": i})
+
+        assert list(cache._memory) == ["key1", "key2"]
+
+    def test_cache_memory_tier_size_limit(self):
+        """Test that the memory tier is bounded by the size of the cached responses."""
+        cache = APICache(cache_dir=self.temp_dir, expiry_seconds=3600, enabled=True,
+                         memory_max_bytes=250)
+        for i in range(3):
+            cache.save_to_cache(f"key{i}", {"values": ["x" * 100]})
+
+        # Each entry is just over 100 bytes of JSON: only the last two fit
+        assert list(cache._memory) == ["key1", "key2"]
+
+        # Responses larger than the limit are only kept on disk
+        cache.save_to_cache("key1", {"values": ["x" * 300]})
+        assert list(cache._memory) == ["key2"]
+        assert cache.get_from_cache("key1") == {"values": ["x" * 300]}
+        assert list(cache._memory) == ["key2"]
+
+    def test_cache_paths_overridable(self):
+        """Test that all cache file access goes through get_cache_path and get_meta_path."""
+        class NestedCache(APICache):
+            def get_cache_path(self, cache_key):
+                return os.path.join(self.cache_dir, "data", f"{cache_key}.json")
+
+            def get_meta_path(self, cache_key):
+                return os.path.join(self.cache_dir, "data", f"{cache_key}.validators")
+
+        os.makedirs(os.path.join(self.temp_dir, "data"))
+        cache = NestedCache(cache_dir=self.temp_dir, expiry_seconds=3600, enabled=True, memory_size=0)
+        cache.save_to_cache("key", {"a": 1}, validators={"etag": '"v1"'})
+
+        assert sorted(os.listdir(os.path.join(self.temp_dir, "data"))) == ["key.json", "key.validators"]
+        assert cache.is_cache_valid("key")
+        assert cache.get_from_cache("key") == {"a": 1}
+        assert cache.get_validators("key") == {"etag": '"v1"'}
+        assert cache.touch_cache("key", {"a": 1})
+
+    def test_cache_expiry_jitter(self):
+        """Test that expiry is spread per key but never exceeds the configured time."""
+        expiries = {self.cache.get_expiry_seconds(f"key{i}") for i in range(50)}
+
+        assert len(expiries) > 1
+        assert all(0.85 * 3600 <= e <= 3600 for e in expiries)
+        assert self.cache.get_expiry_seconds("key0") == self.cache.get_expiry_seconds("key0")
+
     def test_cache_info(self):
         """Test cache information retrieval."""
         # Get info on empty cache
@@ -140,6 +270,23 @@ class TestAPICache:
         info = self.cache.get_cache_info()
         assert info["file_count"] == 0
 
+    def test_cache_validators(self):
+        """Test that HTTP validators are stored and cleared with their entry."""
+        validators = {"etag": '"abc123"', "last_modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+        self.cache.save_to_cache("key1", {"data": "test1"}, validators=validators)
+
+        assert self.cache.get_validators("key1") == validators
+        assert self.cache.get_validators("missing") == {}
+        assert self.cache.get_cache_info()["file_count"] == 1
+
+        # Saving without validators drops the outdated ones
+        self.cache.save_to_cache("key1", {"data": "test2"})
+        assert self.cache.get_validators("key1") == {}
+
+        self.cache.save_to_cache("key1", {"data": "test1"}, validators=validators)
+        assert self.cache.clear_cache() == 1
+        assert os.listdir(self.temp_dir) == []
+
 
 class TestTrafikanalysClient:
     """Test the main client functionality."""
@@ -165,6 +312,58 @@ class TestTrafikanalysClient:
         assert self.client.language == "sv"
         assert self.client.BASE_URL == "https://api.trafa.se/api"
         assert self.client.cache.enabled == True
+
+    def test_session_configuration(self):
+        """Test the session's default headers and that the transport does not retry."""
+        adapter = self.client.session.get_adapter(self.client.BASE_URL)
+
+        assert adapter.max_retries.total == 0
+        assert self.client.session.headers['User-Agent'].startswith('trafapy/')
+        assert self.client.session.headers['Accept'] == 'application/json'
+        assert 'gzip' in self.client.session.headers['Accept-Encoding']
+
+    @pytest.mark.parametrize("client_options", [
+        {"enable_retry": False},
+        {"rate_limit_enabled": False},
+    ])
+    def test_error_responses_not_retried_by_transport(self, client_options):
+        """Test that error responses are only retried by the rate limiter, if at all."""
+        import threading
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+
+        attempts = []
+
+        class Unavailable(BaseHTTPRequestHandler):
+            def do_GET(self):
+                attempts.append(self.path)
+                self.send_response(503)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Unavailable)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = TrafikanalysClient(cache_enabled=False, **client_options)
+            with pytest.raises(requests.exceptions.RequestException):
+                client._make_request(f"http://127.0.0.1:{server.server_port}/data", {"query": "t10016"})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert len(attempts) == 1
+
+    def test_context_manager_closes_session(self):
+        """Test that leaving the with block closes the session."""
+        with patch('requests.Session.close') as mock_close:
+            with TrafikanalysClient(cache_enabled=False) as client:
+                assert isinstance(client, TrafikanalysClient)
+                mock_close.assert_not_called()
+            mock_close.assert_called_once()
     
     @patch('requests.Session.get')
     def test_make_request_success(self, mock_get):
@@ -172,7 +371,7 @@ class TestTrafikanalysClient:
         # Mock successful response
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {"test": "data"}
+        mock_response.content = b'{"test": "data"}'
         mock_get.return_value = mock_response
         
         url = "https://api.trafa.se/api/structure"
@@ -180,7 +379,7 @@ class TestTrafikanalysClient:
         
         result = self.client._make_request(url, params)
         assert result == {"test": "data"}
-        mock_get.assert_called_once_with(url, params=params)
+        mock_get.assert_called_once_with(url, params=params, timeout=self.client.REQUEST_TIMEOUT)
     
     @patch('requests.Session.get')
     def test_make_request_failure(self, mock_get):
@@ -196,6 +395,60 @@ class TestTrafikanalysClient:
         
         result = self.client._make_request(url, params)
         assert result == {}
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    @patch('requests.Session.get')
+    def test_make_request_malformed_json(self, mock_get, use_orjson):
+        """Test that a malformed body raises requests' JSONDecodeError with either parser."""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.content = b'{bad'
+        mock_get.return_value = mock_response
+
+        parser = trafapy.client.orjson if use_orjson else None
+        with patch('trafapy.client.orjson', parser):
+            with pytest.raises(requests.exceptions.JSONDecodeError) as excinfo:
+                self.client._make_request_raw("https://api.trafa.se/api/data", {"query": "t10016"})
+
+        assert isinstance(excinfo.value, requests.exceptions.RequestException)
+        assert isinstance(excinfo.value, ValueError)
+
+    @patch('requests.Session.get')
+    def test_make_request_uri_too_long(self, mock_get, caplog):
+        """Test that an over-long request URL is reported."""
+        mock_response = Mock()
+        mock_response.status_code = 414
+        mock_response.text = "URI Too Long"
+        mock_get.return_value = mock_response
+
+        with caplog.at_level("WARNING", logger="trafapy.client"):
+            result = self.client._make_request("https://api.trafa.se/api/data", {"query": "t10016"})
+
+        assert result == {}
+        assert "HTTP 414" in caplog.text
+
+    @patch('requests.Session.get')
+    def test_conditional_refresh_not_modified(self, mock_get):
+        """Test that an expired entry is revalidated with its ETag and reused on 304."""
+        first = Mock(status_code=200, content=b'{"StructureItems": []}',
+                     headers={"ETag": '"v1"'})
+        not_modified = Mock(status_code=304, content=b'', headers={})
+        mock_get.side_effect = [first, not_modified]
+
+        data = self.client._get_structure(query="t10016")
+
+        # Age the cache file past its expiry and drop the in-memory copy
+        cache_file = [f for f in os.listdir(self.temp_dir) if f.endswith(".json")][0]
+        os.utime(os.path.join(self.temp_dir, cache_file), (0, 0))
+        self.client.cache._memory.clear()
+
+        assert self.client._get_structure(query="t10016") == data
+        assert mock_get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+
+        # The entry is fresh again
+        assert self.client._get_structure(query="t10016") == data
+        assert mock_get.call_count == 2
     
     def test_build_query(self):
         """Test query building functionality."""
@@ -229,6 +482,16 @@ class TestTrafikanalysClient:
         query = self.client._build_query(product_code, variables)
         expected = "t10016|ar:2020|drivmedel:101,102"
         assert query == expected
+
+    def test_build_query_non_string_values(self):
+        """Test query building with non-string values."""
+        variables = {
+            "ar": [2020, "2021"],
+            "drivmedel": [101, 102]
+        }
+
+        query = self.client._build_query("t10016", variables)
+        assert query == "t10016|ar:2020,2021|drivmedel:101,102"
     
     @patch('trafapy.client.TrafikanalysClient._make_request')
     def test_list_products(self, mock_request):
@@ -273,6 +536,63 @@ class TestTrafikanalysClient:
         products_df = self.client.list_products()
         assert isinstance(products_df, pd.DataFrame)
         assert len(products_df) == 0
+
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_structure_memoized_in_process(self, mock_request):
+        """Test that repeated structure lookups are served from process memory."""
+        mock_request.return_value = {"StructureItems": [{"Name": "t10016"}]}
+
+        first = self.client._get_structure(query="t10016")
+
+        # Remove the cache files, the second lookup is answered from memory
+        for name in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, name))
+        second = self.client._get_structure(query="t10016")
+
+        assert first == second
+        assert mock_request.call_count == 1
+
+        # Clearing the cache also drops the in-memory copies
+        self.client.clear_cache()
+        self.client._get_structure(query="t10016")
+        assert mock_request.call_count == 2
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_list_products_reuses_dataframe(self, mock_request):
+        """Test that the product table is built once while the response is in memory."""
+        mock_request.return_value = {"StructureItems": [{"Name": "t10016", "Label": "Personbilar"}]}
+        
+        first = self.client.list_products()
+        first.loc[0, "code"] = "changed"
+        
+        with patch('pandas.DataFrame.from_records') as mock_from_records:
+            second = self.client.list_products()
+        
+        mock_from_records.assert_not_called()
+        assert list(second["code"]) == ["t10016"]
+        
+        # Dropping the memory tier keeps the files but rebuilds the table
+        self.client.clear_memory_cache()
+        assert len(self.client.cache._memory) == 0
+        assert self.client.get_cache_info()["file_count"] == 1
+        assert list(self.client.list_products()["code"]) == ["t10016"]
+        assert mock_request.call_count == 1
+    
+    @patch('trafapy.client.TrafikanalysClient._make_request')
+    def test_search_products_reuses_lowercased_text(self, mock_request):
+        """Test that repeated searches lowercase the product table only once."""
+        mock_request.return_value = {"StructureItems": [
+            {"Name": "t10016", "Label": "Personbilar", "Description": "Bilar i trafik"},
+            {"Name": "t10013", "Label": "Lastbilar", "Description": "Tunga fordon"}
+        ]}
+        
+        assert list(self.client.search_products("PERSON")["code"]) == ["t10016"]
+        
+        haystack = self.client._product_haystack[1]
+        results = self.client.search_products("fordon")
+        
+        assert self.client._product_haystack[1] is haystack
+        assert list(results["code"]) == ["t10013"]
     
     @patch('trafapy.client.TrafikanalysClient.list_products')
     def test_search_products(self, mock_list_products):
@@ -311,6 +631,20 @@ class TestTrafikanalysClient:
         # Search with no matches
         results = self.client.search_products("nonexistent")
         assert len(results) == 0
+
+    @patch('trafapy.client.TrafikanalysClient.list_products')
+    def test_search_products_literal_match(self, mock_list_products):
+        """Test that search terms are matched literally and missing descriptions are handled."""
+        mock_list_products.return_value = pd.DataFrame([
+            {"code": "t10016", "label": "Personbilar (el)", "description": None},
+            {"code": "t10013", "label": "Lastbilar", "description": "Statistics about trucks"}
+        ])
+
+        results = self.client.search_products("(el)")
+        assert list(results["code"]) == ["t10016"]
+
+        results = self.client.search_products("TRUCKS")
+        assert list(results["code"]) == ["t10013"]
     
     def test_process_row(self):
         """Test row processing functionality."""
@@ -335,6 +669,22 @@ class TestTrafikanalysClient:
         expected_single = {"ar": "2020"}
         assert processed_single == expected_single
     
+    def test_process_filter_options(self):
+        """Test that only values and filters are collected, in order."""
+        items = [
+            {"Type": "DV", "Name": "2020", "Label": "2020", "UniqueId": "ar_2020"},
+            {"Type": "H", "Name": "group", "Label": "Group"},
+            {"Type": "F", "Name": "senaste", "Label": "Senaste", "Description": "Latest"}
+        ]
+        
+        filter_options = []
+        self.client._process_filter_options(items, filter_options)
+        
+        assert [o["name"] for o in filter_options] == ["2020", "senaste"]
+        assert [o["option_type"] for o in filter_options] == ["Value", "Filter"]
+        assert filter_options[0]["description"] == ""
+        assert filter_options[1]["unique_id"] == ""
+    
     def test_data_to_dataframe(self):
         """Test data to DataFrame conversion."""
         # Mock API data response
@@ -363,6 +713,23 @@ class TestTrafikanalysClient:
         assert df.iloc[0]["ar"] == "2020"
         assert df.iloc[1]["ar"] == "2021"
     
+    def test_data_to_dataframe_varying_columns(self):
+        """Test rows whose columns differ from the first row."""
+        api_data = {
+            "Rows": [
+                {"Cell": [{"Column": "ar", "Value": "2020"}, {"Column": "antal", "Value": "1"}]},
+                {"Cell": [{"Column": "antal", "Value": "2"}, {"Column": "ar", "Value": "2021"}]},
+                {"Cell": [{"Column": "ar", "Value": "2022"}]}
+            ]
+        }
+        
+        df = self.client._data_to_dataframe(api_data)
+        
+        assert list(df.columns) == ["ar", "antal"]
+        assert list(df["ar"]) == ["2020", "2021", "2022"]
+        assert df.iloc[1]["antal"] == "2"
+        assert pd.isna(df.iloc[2]["antal"])
+    
     def test_data_to_dataframe_empty(self):
         """Test data to DataFrame conversion with empty data."""
         empty_data = {"Rows": []}
@@ -481,7 +848,7 @@ class TestErrorHandling:
         with patch('requests.Session.get') as mock_get:
             mock_response = Mock()
             mock_response.status_code = 200
-            mock_response.json.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
+            mock_response.content = b"Invalid JSON"
             mock_get.return_value = mock_response
             
             with pytest.raises(json.JSONDecodeError):
@@ -514,16 +881,16 @@ class TestUtilityFunctions:
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
     
-    @patch('trafapy.client.TrafikanalysClient.explore_variable_options')
+    @patch('trafapy.client.TrafikanalysClient._collect_variable_options')
     def test_get_all_available_values(self, mock_explore):
         """Test getting all available values for a variable."""
-        # Mock the explore_variable_options method
-        mock_options = pd.DataFrame([
+        # Mock the _collect_variable_options method
+        mock_options = [
             {"name": "2020", "label": "2020", "description": "", "option_type": "Value"},
             {"name": "2021", "label": "2021", "description": "", "option_type": "Value"},
             {"name": "2022", "label": "2022", "description": "", "option_type": "Value"},
             {"name": "t1", "label": "Totalt", "description": "", "option_type": "Value"}
-        ])
+        ]
         mock_explore.return_value = mock_options
         
         values = self.client.get_all_available_values("t10016", "ar")
@@ -584,6 +951,17 @@ class TestUtilityFunctions:
         output = captured_output.getvalue()
         assert "https://api.trafa.se/api/data?query=" in output
 
+    def test_preview_query_quiet(self, capsys):
+        """Test that preview_query only builds the query when verbose is False."""
+        query_dict = {"ar": [str(year) for year in range(1900, 2000)]}
+
+        with patch.object(self.client, '_needs_batching') as mock_needs_batching:
+            query_string = self.client.preview_query("t10016", query_dict, verbose=False)
+
+        assert query_string.startswith("t10016|ar:1900,1901")
+        mock_needs_batching.assert_not_called()
+        assert capsys.readouterr().out == ""
+
 
 # Test configuration and markers
 def pytest_configure(config):
@@ -4,13 +4,77 @@ Utilities for caching API responses.
 
 import os
 import json
+import mmap
 import time
+import zlib
 import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional, Callable
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Default cache directory
 DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".trafapy_cache")
 
+# Cache files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD_BYTES = 16 * 1024
+
+# Default limit on the encoded (JSON) size of the responses held in memory
+MEMORY_MAX_BYTES = 16 * 1024 * 1024
+
+# Entries expire up to this fraction of the expiry time early, spread per key,
+# so entries written together do not all go cold at the same moment
+EXPIRY_JITTER = 0.15
+
+def _dumps(data: Any) -> bytes:
+    """
+    Serialize data to UTF-8 encoded JSON.
+    
+    Args:
+        data: Data to serialize
+        
+    Returns:
+        JSON document as bytes
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # orjson is stricter than json (e.g. non-string keys), fall through
+            pass
+    
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _replace_file(path: str, content: bytes) -> None:
+    """
+    Write a file by renaming a complete temporary file over it.
+    
+    The old file is never truncated, so readers that have it open or
+    memory-mapped keep seeing its previous content.
+    
+    Args:
+        path: File to write
+        content: New content of the file
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 class APICache:
     """
     Cache for API responses to improve performance and reduce API load.
@@ -18,7 +82,8 @@ class APICache:
     
     def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, 
                  expiry_seconds: int = 86400,  # Default: 1 day
-                 enabled: bool = True):
+                 enabled: bool = True, memory_size: int = 128,
+                 memory_max_bytes: int = MEMORY_MAX_BYTES):
         """
         Initialize the cache.
         
@@ -26,15 +91,26 @@ class APICache:
             cache_dir: Directory to store cache files
             expiry_seconds: Cache expiry time in seconds
             enabled: Whether caching is enabled
+            memory_size: Maximum number of entries kept in process memory in
+                front of the cache files (0 disables the memory tier)
+            memory_max_bytes: Maximum total JSON size of the entries kept in
+                memory; larger responses are only cached on disk
         """
         self.cache_dir = cache_dir
         self.expiry_seconds = expiry_seconds
         self.enabled = enabled
+        self.memory_size = memory_size
+        self.memory_max_bytes = memory_max_bytes
+        
+        # In-process LRU of cache_key -> (expires_at, data, JSON size in bytes)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_lock = threading.Lock()
 
     def _ensure_cache_dir_exists(self):
         """Ensure cache directory exists if caching is enabled."""
         if self.enabled and not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
+            os.makedirs(self.cache_dir, exist_ok=True)
 
     def generate_cache_key(self, url: str, params: Dict[str, Any]) -> str:
         """
@@ -47,11 +123,14 @@ class APICache:
         Returns:
             Cache key
         """
-        # Create a string representation of the request
-        request_str = f"{url}?{json.dumps(params, sort_keys=True)}"
+        # Compact, key-sorted encoding of the parameters so equal requests
+        # always hash the same bytes
+        payload = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
         
-        # Hash the request string
-        hash_obj = hashlib.md5(request_str.encode('utf-8'))
+        # Hash the URL and parameters without building an intermediate string
+        hash_obj = hashlib.md5(url.encode('utf-8'))
+        hash_obj.update(b'?')
+        hash_obj.update(payload.encode('utf-8'))
         return hash_obj.hexdigest()
     
     def get_cache_path(self, cache_key: str) -> str:
@@ -66,6 +145,70 @@ class APICache:
         """
         return os.path.join(self.cache_dir, f"{cache_key}.json")
     
+    def get_meta_path(self, cache_key: str) -> str:
+        """
+        Get the path of the file holding the HTTP validators for a cache key.
+        
+        Args:
+            cache_key: Cache key
+            
+        Returns:
+            Validator (.meta) file path
+        """
+        return os.path.join(self.cache_dir, f"{cache_key}.meta")
+    
+    def get_expiry_seconds(self, cache_key: str) -> float:
+        """
+        Get the jittered expiry time for a cache key.
+        
+        The jitter is derived from the key, so an entry always expires at the same
+        age, while different entries written at the same time expire at different ones.
+        
+        Args:
+            cache_key: Cache key
+            
+        Returns:
+            Expiry time in seconds, between (1 - EXPIRY_JITTER) and 1 times expiry_seconds
+        """
+        spread = zlib.crc32(cache_key.encode('utf-8')) / 0xFFFFFFFF
+        return self.expiry_seconds * (1.0 - EXPIRY_JITTER * spread)
+    
+    def _get_from_memory(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Get a non-expired entry from the memory tier, or None."""
+        with self._memory_lock:
+            entry = self._memory.get(cache_key)
+            if entry is None:
+                return None
+            
+            expires_at, data, size = entry
+            if time.time() >= expires_at:
+                del self._memory[cache_key]
+                self._memory_bytes -= size
+                return None
+            
+            self._memory.move_to_end(cache_key)
+            return data
+    
+    def _save_to_memory(self, cache_key: str, data: Dict[str, Any], expires_at: float, size: int):
+        """
+        Store an entry in the memory tier, evicting the least recently used ones
+        until both the entry count and the total size are within their limits.
+        """
+        with self._memory_lock:
+            # Any older copy is outdated, even if the new data is not kept
+            old_entry = self._memory.pop(cache_key, None)
+            if old_entry is not None:
+                self._memory_bytes -= old_entry[2]
+            
+            if self.memory_size <= 0 or size > self.memory_max_bytes:
+                return
+            
+            self._memory[cache_key] = (expires_at, data, size)
+            self._memory_bytes += size
+            while len(self._memory) > self.memory_size or self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted[2]
+    
     def is_cache_valid(self, cache_key: str) -> bool:
         """
         Check if a cache file exists and is not expired.
@@ -79,46 +222,136 @@ class APICache:
         if not self.enabled:
             return False
         
+        if self._get_from_memory(cache_key) is not None:
+            return True
+        
         cache_path = self.get_cache_path(cache_key)
         
-        if not os.path.exists(cache_path):
+        try:
+            file_mod_time = os.stat(cache_path).st_mtime
+        except OSError:
             return False
         
         # Check if file is expired
-        file_mod_time = os.path.getmtime(cache_path)
-        current_time = time.time()
-        
-        return (current_time - file_mod_time) < self.expiry_seconds
+        return (time.time() - file_mod_time) < self.get_expiry_seconds(cache_key)
     
-    def get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
+    def get_from_cache(self, cache_key: str, allow_expired: bool = False) -> Optional[Dict[str, Any]]:
         """
         Get data from cache.
         
+        The memory tier is checked first; entries read from disk are promoted to it.
+        The returned data may be shared with later cache hits and must not be modified.
+        
         Args:
             cache_key: Cache key
+            allow_expired: Also return expired data that is still on disk
             
         Returns:
             Cached data or None if not found
         """
-        if not self.is_cache_valid(cache_key):
+        if not self.enabled:
             return None
         
+        data = self._get_from_memory(cache_key)
+        if data is not None:
+            return data
+        
+        expiry = self.get_expiry_seconds(cache_key)
         cache_path = self.get_cache_path(cache_key)
         
+        # A single stat gives both the age and the size of the cache file
+        try:
+            file_stat = os.stat(cache_path)
+        except OSError:
+            return None
+        
+        expired = (time.time() - file_stat.st_mtime) >= expiry
+        if expired and not allow_expired:
+            return None
+        
         try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError, IOError):
-            # If reading cache fails, return None
+            with open(cache_path, 'rb') as f:
+                if orjson is not None and file_stat.st_size >= MMAP_THRESHOLD_BYTES:
+                    # Parse large files straight from the mapped pages
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        with memoryview(mm) as view:
+                            data = orjson.loads(view)
+                else:
+                    content = f.read()
+                    data = orjson.loads(content) if orjson is not None else json.loads(content)
+        except (ValueError, OSError):
+            # If reading cache fails (corrupt, truncated or missing file), return None
             return None
+        
+        # Keep it in memory for the rest of the file's lifetime
+        if not expired:
+            self._save_to_memory(cache_key, data, file_stat.st_mtime + expiry, file_stat.st_size)
+        return data
+    
+    def get_validators(self, cache_key: str) -> Dict[str, str]:
+        """
+        Get the HTTP validators (ETag and Last-Modified) stored with a cache entry.
+        
+        Validators are only returned while the cached data itself is still on
+        disk, since a "304 Not Modified" answer is useless without it.
+        
+        Args:
+            cache_key: Cache key
+            
+        Returns:
+            Dictionary with 'etag' and/or 'last_modified', empty if none are stored
+        """
+        if not self.enabled:
+            return {}
+        
+        cache_path = self.get_cache_path(cache_key)
+        
+        if not os.path.exists(cache_path):
+            return {}
+        
+        try:
+            with open(self.get_meta_path(cache_key), 'rb') as f:
+                validators = json.loads(f.read())
+        except (ValueError, OSError):
+            return {}
+        
+        return validators if isinstance(validators, dict) else {}
     
-    def save_to_cache(self, cache_key: str, data: Dict[str, Any]) -> bool:
+    def touch_cache(self, cache_key: str, data: Dict[str, Any]) -> bool:
+        """
+        Restart the expiry time of an existing cache entry without rewriting it.
+        
+        Args:
+            cache_key: Cache key
+            data: Data of the cache entry, kept in the memory tier
+            
+        Returns:
+            True if the entry was refreshed, False otherwise
+        """
+        if not self.enabled:
+            return False
+        
+        cache_path = self.get_cache_path(cache_key)
+        
+        try:
+            os.utime(cache_path)
+            size = os.path.getsize(cache_path)
+        except OSError:
+            return False
+        
+        self._save_to_memory(cache_key, data, time.time() + self.get_expiry_seconds(cache_key), size)
+        return True
+    
+    def save_to_cache(self, cache_key: str, data: Dict[str, Any],
+                      validators: Optional[Dict[str, str]] = None) -> bool:
         """
         Save data to cache.
         
         Args:
             cache_key: Cache key
             data: Data to cache
+            validators: HTTP validators of the response ('etag', 'last_modified'),
+                stored next to the data for conditional requests
             
         Returns:
             True if saving was successful, False otherwise
@@ -130,9 +363,20 @@ class APICache:
 
         cache_path = self.get_cache_path(cache_key)
         
+        content = _dumps(data)
+        
+        self._save_to_memory(cache_key, data, time.time() + self.get_expiry_seconds(cache_key), len(content))
+        
+        meta_path = self.get_meta_path(cache_key)
+        
         try:
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False)
+            _replace_file(cache_path, content)
+            
+            if validators:
+                _replace_file(meta_path, json.dumps(validators).encode('utf-8'))
+            elif os.path.exists(meta_path):
+                # Validators of an older response no longer match the data
+                os.remove(meta_path)
             return True
         except (IOError, OSError):
             # If saving cache fails, return False
@@ -148,6 +392,9 @@ class APICache:
         Returns:
             Number of files deleted
         """
+        # The memory tier only mirrors files, drop it entirely
+        self.clear_memory()
+        
         if not os.path.exists(self.cache_dir):
             return 0
         
@@ -171,9 +418,21 @@ class APICache:
                     count += 1
                 except OSError:
                     pass
+                
+                # Remove the validators stored with the file, if any
+                try:
+                    os.remove(self.get_meta_path(file[:-len('.json')]))
+                except OSError:
+                    pass
         
         return count
     
+    def clear_memory(self) -> None:
+        """Clear the in-memory tier, keeping the cache files."""
+        with self._memory_lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+    
     def get_cache_info(self) -> Dict[str, Any]:
         """
         Get information about the cache.
@@ -248,16 +507,23 @@ class APICache:
 
 
 def cached_api_request(cache: APICache, request_func: Callable, url: str, params: Dict[str, Any], 
-                       debug: bool = False) -> Dict[str, Any]:
+                       debug: bool = False, conditional: bool = False) -> Dict[str, Any]:
     """
     Make an API request with caching.
     
+    With conditional=True, request_func is called with a validators keyword:
+    a dictionary holding the 'etag'/'last_modified' of an expired cache entry
+    (empty if there is none), which request_func updates in place from the
+    response. request_func returns None if the server answered
+    "304 Not Modified", in which case the expired entry is reused.
+    
     Args:
         cache: APICache instance
         request_func: Function to make the actual request
         url: Request URL
         params: Request parameters
         debug: Whether to print debug information
+        conditional: Whether request_func supports conditional requests
         
     Returns:
         API response data
@@ -276,12 +542,31 @@ def cached_api_request(cache: APICache, request_func: Callable, url: str, params
     if debug:
         print(f"Making API request to {url}")
     
-    response_data = request_func(url, params)
+    validators = None
+    
+    if conditional:
+        validators = cache.get_validators(cache_key)
+        response_data = request_func(url, params, validators=validators)
+        
+        if response_data is None:
+            # Not modified, the expired entry is still current
+            stale_data = cache.get_from_cache(cache_key, allow_expired=True)
+            if stale_data is not None:
+                cache.touch_cache(cache_key, stale_data)
+                if debug:
+                    print(f"Response not modified, refreshed cache entry {cache_key}")
+                return stale_data
+            
+            # The entry disappeared in the meantime, fetch it in full
+            validators.clear()
+            response_data = request_func(url, params, validators=validators) or {}
+    else:
+        response_data = request_func(url, params)
     
     # Cache the response
     if response_data:
-        success = cache.save_to_cache(cache_key, response_data)
+        success = cache.save_to_cache(cache_key, response_data, validators=validators)
         if debug and success:
             print(f"Saved response to cache with key {cache_key}")
     
-    return response_data
\ No newline at end of file
+    return response_data
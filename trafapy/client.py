@@ -1,12 +1,27 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 import pandas as pd
+import asyncio
+import json
 import logging
+import threading
 import time
+from collections import deque
+from email.utils import parsedate_to_datetime
 from typing import Dict, List, Union, Optional, Any
-from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 from itertools import product
+from operator import itemgetter
 import math
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from . import __version__
 from .cache_utils import APICache, cached_api_request, DEFAULT_CACHE_DIR
 
 logger = logging.getLogger(__name__)
@@ -15,24 +30,28 @@ def rate_limit(calls_per_second: float = 1.0):
     """
     Decorator to rate limit function calls.
     
+    The interval is tracked per decorated function, so for methods it is shared
+    by all instances; TrafikanalysClient uses its own RateLimiter instead.
+    
     Args:
         calls_per_second: Maximum number of calls per second allowed
     """
     min_interval = 1.0 / calls_per_second
-    last_called = [0.0]
     
     def decorator(func):
+        last_called = float('-inf')
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            elapsed = time.time() - last_called[0]
-            left_to_wait = min_interval - elapsed
+            nonlocal last_called
+            left_to_wait = min_interval - (time.monotonic() - last_called)
             if left_to_wait > 0:
-                if len(args) > 0 and hasattr(args[0], 'debug') and args[0].debug:
+                if args and getattr(args[0], 'debug', False):
                     print(f"Rate limiting: waiting {left_to_wait:.2f} seconds")
                 time.sleep(left_to_wait)
             
             result = func(*args, **kwargs)
-            last_called[0] = time.time()
+            last_called = time.monotonic()
             return result
         return wrapper
     return decorator
@@ -43,26 +62,54 @@ class RateLimiter:
     Advanced rate limiter with burst support and backoff strategies.
     """
     
+    # Upper bound for waits requested by the server (Retry-After, rate limit reset)
+    MAX_SERVER_WAIT = 60.0
+    
+    # Adjustment of the burst limit: added after each successful call,
+    # multiplied in when the server is overloaded
+    BURST_INCREASE = 0.5
+    BURST_DECREASE = 0.5
+    
     def __init__(self, calls_per_second: float = 1.0, burst_size: int = 5, 
-                 backoff_factor: float = 2.0, max_retries: int = 3):
+                 backoff_factor: float = 2.0, max_retries: int = 3,
+                 latency_target: Optional[float] = None):
         """
         Initialize rate limiter.
         
+        The number of calls allowed in a burst adapts between 1 and burst_size:
+        it is halved when the server answers "429 Too Many Requests" (or, with
+        a latency_target, when recent calls are slower than the target on
+        average) and grows back gradually with each successful call.
+        
         Args:
             calls_per_second: Base rate limit (calls per second)
-            burst_size: Number of calls allowed in a burst
+            burst_size: Maximum number of calls allowed in a burst
             backoff_factor: Exponential backoff multiplier for retries
             max_retries: Maximum number of retry attempts
+            latency_target: Average call duration in seconds above which
+                bursts are reduced (None to adapt to 429 responses only)
         """
         self.calls_per_second = calls_per_second
         self.burst_size = burst_size
         self.backoff_factor = backoff_factor
         self.max_retries = max_retries
+        self.latency_target = latency_target
         
-        # Sliding window for burst control
-        self.call_times = []
+        # Current burst limit, adjusted from server responses
+        self.burst_limit = float(burst_size)
+        self._latencies = deque(maxlen=20)
+        self._adjust_lock = threading.Lock()
+        
+        # Sliding window for burst control (time.monotonic() values), oldest call first
+        self.call_times = deque()
         self.min_interval = 1.0 / calls_per_second
         
+        # Serializes slot reservation when requests are made from several threads
+        self._lock = threading.Lock()
+        
+        # Monotonic time before which no call is made, set from server rate limit headers
+        self._resume_at = 0.0
+        
     def wait_if_needed(self, debug: bool = False):
         """
         Wait if rate limit would be exceeded.
@@ -70,32 +117,43 @@ class RateLimiter:
         Args:
             debug: Whether to print debug information
         """
-        current_time = time.time()
-        
-        # Clean old calls (older than 1 second for burst window)
-        self.call_times = [t for t in self.call_times if current_time - t < 1.0]
-        
-        # Check burst limit
-        if len(self.call_times) >= self.burst_size:
-            sleep_time = 1.0 - (current_time - self.call_times[0])
-            if sleep_time > 0:
-                if debug:
-                    print(f"Burst limit reached: waiting {sleep_time:.2f} seconds")
-                time.sleep(sleep_time)
-                current_time = time.time()
-        
-        # Check base rate limit
-        if self.call_times:
-            time_since_last = current_time - self.call_times[-1]
-            if time_since_last < self.min_interval:
-                sleep_time = self.min_interval - time_since_last
+        with self._lock:
+            current_time = time.monotonic()
+            
+            # Pause while the server reported its rate limit as exhausted
+            if self._resume_at > current_time:
+                sleep_time = self._resume_at - current_time
                 if debug:
-                    print(f"Rate limit: waiting {sleep_time:.2f} seconds")
+                    print(f"Server rate limit nearly exhausted: waiting {sleep_time:.2f} seconds")
                 time.sleep(sleep_time)
-                current_time = time.time()
-        
-        # Record this call
-        self.call_times.append(current_time)
+                current_time = time.monotonic()
+            
+            # Clean old calls (older than 1 second for burst window)
+            call_times = self.call_times
+            while call_times and current_time - call_times[0] >= 1.0:
+                call_times.popleft()
+            
+            # Check burst limit
+            if len(call_times) >= max(1, int(self.burst_limit)):
+                sleep_time = 1.0 - (current_time - self.call_times[0])
+                if sleep_time > 0:
+                    if debug:
+                        print(f"Burst limit reached: waiting {sleep_time:.2f} seconds")
+                    time.sleep(sleep_time)
+                    current_time = time.monotonic()
+            
+            # Check base rate limit
+            if self.call_times:
+                time_since_last = current_time - self.call_times[-1]
+                if time_since_last < self.min_interval:
+                    sleep_time = self.min_interval - time_since_last
+                    if debug:
+                        print(f"Rate limit: waiting {sleep_time:.2f} seconds")
+                    time.sleep(sleep_time)
+                    current_time = time.monotonic()
+            
+            # Record this call
+            self.call_times.append(current_time)
     
     def execute_with_retry(self, func, *args, debug: bool = False, **kwargs):
         """
@@ -116,7 +174,10 @@ class RateLimiter:
         for attempt in range(self.max_retries + 1):
             try:
                 self.wait_if_needed(debug)
-                return func(*args, **kwargs)
+                start = time.monotonic()
+                result = func(*args, **kwargs)
+                self._record_success(time.monotonic() - start)
+                return result
                 
             except requests.exceptions.RequestException as e:
                 if attempt == self.max_retries:
@@ -125,15 +186,22 @@ class RateLimiter:
                 # Check if it's a rate limit error (HTTP 429)
                 if hasattr(e, 'response') and e.response is not None:
                     if e.response.status_code == 429:
-                        # Rate limited - wait longer
-                        wait_time = (self.backoff_factor ** attempt) * 2
+                        self._record_overload()
+                        
+                        # Rate limited - wait as long as the server asks, or longer
+                        # than for other errors if it does not say
+                        wait_time = self._retry_after(e.response)
+                        if wait_time is None:
+                            wait_time = (self.backoff_factor ** attempt) * 2
                         if debug:
                             print(f"Rate limited (HTTP 429): waiting {wait_time:.2f} seconds before retry {attempt + 1}")
                         time.sleep(wait_time)
                         continue
                     elif e.response.status_code >= 500:
                         # Server error - retry with backoff
-                        wait_time = self.backoff_factor ** attempt
+                        wait_time = self._retry_after(e.response)
+                        if wait_time is None:
+                            wait_time = self.backoff_factor ** attempt
                         if debug:
                             print(f"Server error ({e.response.status_code}): waiting {wait_time:.2f} seconds before retry {attempt + 1}")
                         time.sleep(wait_time)
@@ -141,6 +209,85 @@ class RateLimiter:
                 
                 # For other errors, re-raise immediately
                 raise e
+    
+    def _record_success(self, elapsed: float) -> None:
+        """
+        Grow the burst limit after a successful call, or shrink it if calls are slow.
+        
+        Args:
+            elapsed: Duration of the call in seconds
+        """
+        with self._adjust_lock:
+            if self.latency_target is not None:
+                latencies = self._latencies
+                latencies.append(elapsed)
+                if sum(latencies) / len(latencies) > self.latency_target:
+                    self.burst_limit = max(1.0, self.burst_limit * self.BURST_DECREASE)
+                    return
+            
+            self.burst_limit = min(float(self.burst_size), self.burst_limit + self.BURST_INCREASE)
+    
+    def _record_overload(self) -> None:
+        """Shrink the burst limit after the server reported too many requests."""
+        with self._adjust_lock:
+            self.burst_limit = max(1.0, self.burst_limit * self.BURST_DECREASE)
+    
+    def _retry_after(self, response) -> Optional[float]:
+        """
+        Get the wait time requested by a response's Retry-After header.
+        
+        Args:
+            response: HTTP response
+            
+        Returns:
+            Seconds to wait (capped at MAX_SERVER_WAIT), or None if not given
+        """
+        value = response.headers.get('Retry-After')
+        if not isinstance(value, str):
+            return None
+        
+        try:
+            wait_time = float(value)
+        except ValueError:
+            # HTTP date form
+            try:
+                wait_time = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        
+        return min(max(wait_time, 0.0), self.MAX_SERVER_WAIT)
+    
+    def update_from_headers(self, headers) -> None:
+        """
+        Pause upcoming calls when the server reports its rate limit as nearly used up.
+        
+        Reads X-RateLimit-Remaining and X-RateLimit-Reset (seconds until reset,
+        or a Unix timestamp); when no more than a tenth of burst_size calls remain,
+        calls wait until the reset.
+        
+        Args:
+            headers: Response headers
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if not isinstance(remaining, str) or not isinstance(reset, str):
+            return
+        
+        try:
+            remaining = int(remaining)
+            reset = float(reset)
+        except ValueError:
+            return
+        
+        if remaining > max(1, self.burst_size // 10):
+            return
+        
+        # Large values are absolute (wall clock) timestamps, small ones a delay
+        wait_time = reset - time.time() if reset > 1e9 else reset
+        wait_time = min(max(wait_time, 0.0), self.MAX_SERVER_WAIT)
+        
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + wait_time)
 
 
 class TrafikanalysClient:
@@ -151,12 +298,32 @@ class TrafikanalysClient:
     
     BASE_URL = "https://api.trafa.se/api"
     
+    # (connect, read) timeout in seconds for API requests
+    REQUEST_TIMEOUT = (5, 60)
+    
+    # Value names that represent totals rather than a single category
+    _TOTAL_VALUES = frozenset({'t1', 'totalt', 'total'})
+    
+    # Structure item types: D = variable, M = measure
+    _VARIABLE_TYPES = frozenset({'D', 'M'})
+    
+    # Option item types and their labels: DV = variable value, F = filter
+    _OPTION_TYPES = {'DV': 'Value', 'F': 'Filter'}
+    
+    # Variable item types and their (label, has_filter_options): D = variable,
+    # M = measure, H = hierarchy (a group of further items)
+    _ITEM_TYPES = {
+        'D': ('Variable', True),
+        'M': ('Measure', False),
+        'H': ('Hierarchy', False),
+    }
+    
     def __init__(self, language: str = "sv", debug: bool = False, 
                  cache_enabled: bool = False, cache_dir: str = DEFAULT_CACHE_DIR,
                  cache_expiry_seconds: int = 1800,  # Default: 30 minutes
                  rate_limit_enabled: bool = True, calls_per_second: float = 1.0,
                  burst_size: int = 5, enable_retry: bool = True,
-                 max_batch_size: int = 50):
+                 max_batch_size: int = 50, max_workers: int = 1):
         """
         Initialize the client.
         
@@ -171,17 +338,57 @@ class TrafikanalysClient:
             burst_size: Number of calls allowed in a burst
             enable_retry: Whether to enable automatic retries with backoff
             max_batch_size: Maximum number of values per variable in a single request
+            max_workers: Number of batches of a large query fetched concurrently
+                (1 fetches them one after another); the rate limit still applies
         """
         self.language = language
         self.debug = debug
         self.session = requests.Session()
+        # Advertise every encoding urllib3 can decode here (adds brotli/zstd
+        # when the optional decoders are installed)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'User-Agent': f'trafapy/{__version__}'
+        })
+        
+        # Keep enough pooled connections for concurrent lookups; retries are
+        # left to the rate limiter (see enable_retry), not the transport
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
         self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
         self.cache = APICache(
             cache_dir=cache_dir,
             expiry_seconds=cache_expiry_seconds,
             enabled=cache_enabled
         )
         
+        # Per (product, language): (structure cache key, variable name -> names of
+        # the hierarchies it is nested in); only kept while caching is enabled
+        self._hierarchy_paths = {}
+        
+        # Per (product, language): variable name -> (structure cache key, filter
+        # options), from the product structure or from earlier variable lookups;
+        # only kept while caching is enabled
+        self._variable_options = {}
+        
+        # (structure response, DataFrame) of the last list_products call
+        self._products = None
+        
+        # (structure response, lowercased search text) for search_products
+        self._product_haystack = None
+        
+        # (product, variable, exclude_totals, language) -> (structure cache key,
+        # values found by get_all_available_values); only kept while caching is enabled
+        self._available_values = {}
+        
         # Rate limiting configuration
         self.rate_limit_enabled = rate_limit_enabled
         if rate_limit_enabled:
@@ -193,24 +400,47 @@ class TrafikanalysClient:
         else:
             self.rate_limiter = None
     
-    def _make_request_raw(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def _make_request_raw(self, url: str, params: Dict[str, Any],
+                          validators: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
         """
         Make an HTTP request without rate limiting (internal use).
         
         Args:
             url: Request URL
             params: Request parameters
+            validators: Optional 'etag'/'last_modified' of a cached response, sent as
+                If-None-Match/If-Modified-Since and updated in place from the response
             
         Returns:
-            Response JSON data
+            Response JSON data, or None if the server answered "304 Not Modified"
         """
-        response = self.session.get(url, params=params)
+        headers = {}
+        if validators:
+            if 'etag' in validators:
+                headers['If-None-Match'] = validators['etag']
+            if 'last_modified' in validators:
+                headers['If-Modified-Since'] = validators['last_modified']
+        
+        if headers:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.REQUEST_TIMEOUT)
+        else:
+            response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
+        
+        if response.status_code == 304 and headers:
+            if self.debug:
+                print(f"Not modified: {url}")
+            return None
         
         if response.status_code != 200:
             if self.debug:
                 print(f"Request failed with status code {response.status_code}")
                 print(f"Response text: {response.text}")
             
+            if response.status_code == 414:
+                logger.warning(
+                    "Request URL too long (HTTP 414); use batching or a smaller max_batch_size"
+                )
+            
             # Raise exception for rate limiter to handle
             if response.status_code == 429:
                 raise requests.exceptions.RequestException(f"Rate limited (HTTP 429)", response=response)
@@ -219,25 +449,49 @@ class TrafikanalysClient:
             
             return {}
         
-        return response.json()
+        if self.rate_limiter is not None:
+            self.rate_limiter.update_from_headers(response.headers)
+        
+        if validators is not None:
+            validators.clear()
+            for header, key in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+                value = response.headers.get(header)
+                if isinstance(value, str):
+                    validators[key] = value
+        
+        content = response.content
+        if not content:
+            return {}
+        
+        try:
+            return orjson.loads(content) if orjson is not None else json.loads(content)
+        except ValueError as e:
+            # Raise what response.json() would, so callers catching either
+            # RequestException or ValueError keep working with orjson installed
+            raise requests.exceptions.JSONDecodeError(
+                getattr(e, 'msg', str(e)), getattr(e, 'doc', ''), getattr(e, 'pos', 0),
+                response=response) from e
     
-    def _make_request(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def _make_request(self, url: str, params: Dict[str, Any],
+                      validators: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
         """
         Make an HTTP request with rate limiting and retry logic.
         
         Args:
             url: Request URL
             params: Request parameters
+            validators: Optional HTTP validators for a conditional request,
+                see _make_request_raw
             
         Returns:
-            Response JSON data
+            Response JSON data, or None if the server answered "304 Not Modified"
         """
         if self.rate_limit_enabled and self.rate_limiter:
             return self.rate_limiter.execute_with_retry(
-                self._make_request_raw, url, params, debug=self.debug
+                self._make_request_raw, url, params, debug=self.debug, validators=validators
             )
         else:
-            return self._make_request_raw(url, params)
+            return self._make_request_raw(url, params, validators=validators)
     
     def configure_rate_limiting(self, enabled: bool = True, calls_per_second: float = 1.0,
                               burst_size: int = 5, enable_retry: bool = True):
@@ -264,16 +518,19 @@ class TrafikanalysClient:
             if self.debug:
                 print("Rate limiting disabled")
     
-    def configure_batching(self, max_batch_size: int = 50):
+    def configure_batching(self, max_batch_size: int = 50, max_workers: int = 1):
         """
         Configure batching settings.
         
         Args:
             max_batch_size: Maximum number of values per variable in a single request
+            max_workers: Number of batches fetched concurrently
         """
         self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
         if self.debug:
-            print(f"Batching configured: max {max_batch_size} values per variable")
+            print(f"Batching configured: max {max_batch_size} values per variable, "
+                  f"{max_workers} concurrent batches")
     
     def get_rate_limit_info(self) -> Dict[str, Any]:
         """
@@ -294,6 +551,7 @@ class TrafikanalysClient:
             "enabled": True,
             "calls_per_second": self.rate_limiter.calls_per_second,
             "burst_size": self.rate_limiter.burst_size,
+            "current_burst_limit": int(self.rate_limiter.burst_limit),
             "recent_calls": len(self.rate_limiter.call_times),
             "backoff_factor": self.rate_limiter.backoff_factor,
             "max_retries": self.rate_limiter.max_retries
@@ -307,7 +565,8 @@ class TrafikanalysClient:
             Dictionary with batching information
         """
         return {
-            "max_batch_size": self.max_batch_size
+            "max_batch_size": self.max_batch_size,
+            "max_workers": self.max_workers
         }
      
     def list_products(self) -> pd.DataFrame:
@@ -317,36 +576,45 @@ class TrafikanalysClient:
         Returns:
             DataFrame with product information
         """
-        url = f"{self.BASE_URL}/structure"
-        
-        # Use cached request
-        data = cached_api_request(
-            cache=self.cache,
-            request_func=self._make_request,
-            url=url,
-            params={"lang": self.language},
-            debug=self.debug
-        )
+        data = self._request_structure({"lang": self.language})
         
         if not data or 'StructureItems' not in data:
             if self.debug:
                 print("No products found in response")
             return pd.DataFrame()
         
+        # The cache returns the very same response object while it is held in
+        # memory, in which case the DataFrame built from it can be reused
+        memo = self._products
+        if memo is not None and memo[0] is data:
+            return memo[1].copy()
+        
         products = data['StructureItems']
         
-        product_data = []
-        for product in products:
-            product_data.append({
-                'code': product.get('Name', ''),
-                'label': product.get('Label', ''),
-                'description': product.get('Description', ''),
-                'id': product.get('Id', ''),
-                'unique_id': product.get('UniqueId', ''),
-                'active_from': product.get('ActiveFrom', '')
-            })
+        # Plain tuples avoid building a dict per product
+        product_data = [
+            (
+                product.get('Name', ''),
+                product.get('Label', ''),
+                product.get('Description', ''),
+                product.get('Id', ''),
+                product.get('UniqueId', ''),
+                product.get('ActiveFrom', '')
+            )
+            for product in products
+        ]
+        
+        products_df = pd.DataFrame.from_records(
+            product_data,
+            columns=['code', 'label', 'description', 'id', 'unique_id', 'active_from']
+        )
         
-        return pd.DataFrame(product_data)
+        if self.cache.enabled:
+            self._products = (data, products_df)
+            return products_df.copy()
+        
+        self._products = None
+        return products_df
     
     def search_products(self, search_term):
         """
@@ -365,12 +633,18 @@ class TrafikanalysClient:
         if products.empty:
             return products
     
-        # Search in label and description
-        search_term = search_term.lower()
-        mask = (
-            products['label'].str.lower().str.contains(search_term, na=False) | 
-            products['description'].str.lower().str.contains(search_term, na=False)
-        )
+        # Search label and description in one pass; the NUL separator keeps a
+        # match from spanning the two fields. The lowercased text is kept for
+        # as long as list_products reuses its table.
+        memo, cached = self._products, self._product_haystack
+        if memo is not None and cached is not None and cached[0] is memo[0]:
+            haystack = cached[1]
+        else:
+            haystack = (products['label'].fillna('') + '\x00' + products['description'].fillna('')).str.lower()
+            if memo is not None:
+                self._product_haystack = (memo[0], haystack)
+        
+        mask = haystack.str.contains(search_term.lower(), regex=False, na=False)
     
         return products[mask]
     
@@ -386,18 +660,23 @@ class TrafikanalysClient:
             Query string
         """
         query_parts = [product_code]
+        append = query_parts.append
         
         for var_name, var_values in variables.items():
             if isinstance(var_values, list) and var_values:
-                # Multiple values
-                values_str = ",".join(str(v) for v in var_values)
-                query_parts.append(f"{var_name}:{values_str}")
+                # Multiple values: usually strings already, so join them directly
+                # and only convert when the join rejects a non-string value
+                try:
+                    values_str = ",".join(var_values)
+                except TypeError:
+                    values_str = ",".join(map(str, var_values))
+                append(f"{var_name}:{values_str}")
             elif var_values:
                 # Single value
-                query_parts.append(f"{var_name}:{var_values}")
+                append(f"{var_name}:{var_values}")
             else:
                 # No filter, just include the variable
-                query_parts.append(var_name)
+                append(var_name)
         
         return "|".join(query_parts)
     
@@ -412,11 +691,9 @@ class TrafikanalysClient:
             True if batching is needed, False otherwise
         """
         # Check if any variable has more values than max_batch_size
-        for var_name, var_values in variables.items():
-            if isinstance(var_values, list) and len(var_values) > self.max_batch_size:
-                return True
-                
-        return False
+        max_batch_size = self.max_batch_size
+        return any(isinstance(var_values, list) and len(var_values) > max_batch_size
+                   for var_values in variables.values())
     
     def _create_batches(self, variables: Dict[str, Union[str, List[str]]], 
                        show_progress: bool = None) -> List[Dict[str, Union[str, List[str]]]]:
@@ -435,32 +712,28 @@ class TrafikanalysClient:
             show_progress = self.debug
             
         # Find variables that need batching (have more than max_batch_size values)
-        variables_to_batch = []
-        for var_name, var_values in variables.items():
-            if isinstance(var_values, list) and len(var_values) > self.max_batch_size:
-                variables_to_batch.append((var_name, len(var_values)))
+        max_batch_size = self.max_batch_size
+        large_variables = [
+            (var_name, len(var_values)) for var_name, var_values in variables.items()
+            if isinstance(var_values, list) and len(var_values) > max_batch_size
+        ]
         
-        if not variables_to_batch:
+        if not large_variables:
             return [variables]
         
-        # Sort by size (largest first) to batch the most problematic variable
-        variables_to_batch.sort(key=lambda x: x[1], reverse=True)
-        batch_var_name, batch_var_size = variables_to_batch[0]
+        # Batch the largest (most problematic) variable
+        batch_var_name, batch_var_size = max(large_variables, key=itemgetter(1))
         
         if show_progress:
             print(f"  📋 Batching variable '{batch_var_name}' ({batch_var_size} values)")
-            if len(variables_to_batch) > 1:
-                other_vars = [f"{name}({size})" for name, size in variables_to_batch[1:]]
+            if len(large_variables) > 1:
+                other_vars = [f"{name}({size})" for name, size in
+                              sorted(large_variables, key=itemgetter(1), reverse=True)
+                              if name != batch_var_name]
                 print(f"  ℹ️  Other large variables will be included in all batches: {', '.join(other_vars)}")
         
         # Create batches by splitting the largest variable
-        batch_values = variables[batch_var_name]
-        batches = []
-        
-        for i in range(0, len(batch_values), self.max_batch_size):
-            batch_vars = variables.copy()
-            batch_vars[batch_var_name] = batch_values[i:i + self.max_batch_size]
-            batches.append(batch_vars)
+        batches = list(self._iter_batches(variables, batch_var_name))
         
         if show_progress and batches:
             print(f"  ✅ Created {len(batches)} batches (max {self.max_batch_size} values per variable)")
@@ -478,6 +751,40 @@ class TrafikanalysClient:
         
         return batches if batches else [variables]
     
+    def _iter_batches(self, variables: Dict[str, Union[str, List[str]]], 
+                      batch_var_name: str):
+        """
+        Generate batches by splitting one variable into slices of max_batch_size values.
+        
+        The other variables are shared by all batches; repeated values of the split
+        variable are dropped, as they would only produce overlapping requests.
+        
+        Args:
+            variables: Dictionary of variables and values
+            batch_var_name: Name of the variable to split
+            
+        Yields:
+            Variable dictionaries for batched requests
+        """
+        batch_values = list(dict.fromkeys(variables[batch_var_name]))
+        size = self.max_batch_size
+        
+        for i in range(0, len(batch_values), size):
+            yield {**variables, batch_var_name: batch_values[i:i + size]}
+    
+    def _is_data_cached(self, query: str) -> bool:
+        """
+        Check whether the data for a query is in the cache and not expired.
+        
+        Args:
+            query: Query string
+            
+        Returns:
+            True if _get_data would be answered from the cache
+        """
+        params = {"query": query, "lang": self.language}
+        return self.cache.is_cache_valid(self.cache.generate_cache_key(f"{self.BASE_URL}/data", params))
+    
     def _get_data(self, query: str) -> Dict[str, Any]:
         """
         Get data from the API.
@@ -499,7 +806,8 @@ class TrafikanalysClient:
             request_func=self._make_request,
             url=url,
             params={"query": query, "lang": self.language},
-            debug=self.debug
+            debug=self.debug,
+            conditional=True
         )
         
         if self.debug and 'Rows' in data:
@@ -537,13 +845,26 @@ class TrafikanalysClient:
             param_str = "&".join(f"{k}={v}" for k, v in params.items())
             print(f"Making request to: {url}?{param_str}")
         
+        return self._request_structure(params)
+    
+    def _request_structure(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Request the structure endpoint through the cache.
+        
+        Args:
+            params: Request parameters
+            
+        Returns:
+            API response data
+        """
         # Use cached request
         return cached_api_request(
             cache=self.cache,
             request_func=self._make_request,
-            url=url,
+            url=f"{self.BASE_URL}/structure",
             params=params,
-            debug=self.debug
+            debug=self.debug,
+            conditional=True
         )
     
     def _process_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
@@ -598,20 +919,114 @@ class TrafikanalysClient:
         if self.debug:
             print(f"Processing {len(rows)} rows")
             
-        processed_rows = [self._process_row(row) for row in rows]
-        
-        # Filter out empty rows
-        processed_rows = [row for row in processed_rows if row]
+        # Fastest path: every row lists the same columns in the same order, so
+        # only the values are collected and the column names are given once
+        columns = self._uniform_columns(rows)
+        if columns is not None:
+            column_of, value_of = itemgetter('Column'), itemgetter('Value')
+            values = []
+            append = values.append
+            
+            try:
+                for row in rows:
+                    cells = row['Cell']
+                    if not isinstance(cells, list) or list(map(column_of, cells)) != columns:
+                        break
+                    append(list(map(value_of, cells)))
+                else:
+                    if self.debug:
+                        print(f"Processed {len(values)} rows")
+                        print(f"Columns in first row: {columns}")
+                    return pd.DataFrame(values, columns=columns)
+            except (KeyError, TypeError):
+                # Irregular rows are handled below
+                pass
+        
+        # Empty rows are filtered out as they are produced, without an
+        # intermediate list of all processed rows
+        try:
+            # Fast path: every row carries a list of {Column, Value} cells
+            processed_rows = [
+                processed for processed in (
+                    {cell['Column']: cell['Value'] for cell in row['Cell'] if cell['Column']}
+                    for row in rows
+                )
+                if processed
+            ]
+        except (KeyError, TypeError):
+            # Irregular rows (single-cell dicts, missing keys) take the slow path
+            processed_rows = [
+                processed for processed in map(self._process_row, rows) if processed
+            ]
         
         if self.debug:
             print(f"Processed {len(processed_rows)} rows")
             if processed_rows:
                 print(f"Columns in first row: {list(processed_rows[0].keys())}")
         
-        return pd.DataFrame(processed_rows)
+        return pd.DataFrame.from_records(processed_rows)
+    
+    def _uniform_columns(self, rows: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """
+        Get the column names of the first row if it is a plain, regular row.
+        
+        Args:
+            rows: Rows of an API response
+            
+        Returns:
+            List of column names, or None if the first row has no cells, cells
+            without a column name, or repeated columns
+        """
+        cells = rows[0].get('Cell') if isinstance(rows[0], dict) else None
+        if not isinstance(cells, list) or not cells:
+            return None
+        
+        try:
+            columns = [cell['Column'] for cell in cells]
+        except (KeyError, TypeError):
+            return None
+        
+        if not all(columns) or len(set(columns)) != len(columns):
+            return None
+        
+        return columns
+    
+    def _fetch_batch(self, product_code: str, batch_vars: Dict[str, Union[str, List[str]]]) -> pd.DataFrame:
+        """
+        Fetch the data of a single batch.
+        
+        Args:
+            product_code: The product code
+            batch_vars: Variables and values of the batch
+            
+        Returns:
+            DataFrame with the batch data
+        """
+        query = self._build_query(product_code, batch_vars)
+        data = self._get_data(query)
+        return self._data_to_dataframe(data)
+    
+    def _to_categorical(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert low-cardinality text columns to the category dtype.
+        
+        Args:
+            df: DataFrame to convert in place
+            
+        Returns:
+            The converted DataFrame
+        """
+        max_categories = max(32, len(df) // 20)
+        
+        for col in df.select_dtypes(include=['object', 'string']).columns:
+            if df[col].nunique(dropna=True) <= max_categories:
+                df[col] = df[col].astype('category')
+        
+        return df
     
     def get_data_as_dataframe(self, product_code: str, variables: Dict[str, Union[str, List[str]]], 
-                            use_batching: bool = True, show_progress: bool = True) -> pd.DataFrame:
+                            use_batching: bool = True, show_progress: bool = True,
+                            categorical: bool = False) -> pd.DataFrame:
         """
         Get data from the API as a DataFrame with automatic batching for large queries.
         
@@ -620,6 +1035,8 @@ class TrafikanalysClient:
             variables: Dictionary of variables and values (e.g., {"ar": ["2020", "2021"]})
             use_batching: Whether to use automatic batching for large queries
             show_progress: Whether to show progress messages (True by default, can be overridden by debug mode)
+            categorical: Whether to store columns with few distinct values (years,
+                regions, fuel types, ...) as category dtype to save memory
             
         Returns:
             DataFrame with the data
@@ -634,37 +1051,64 @@ class TrafikanalysClient:
             all_dataframes = []
             total_rows = 0
             
-            for i, batch_vars in enumerate(batches):
-                batch_num = i + 1
+            # Batches are fetched concurrently when configured, but always
+            # reported and combined in order. Batches already in the cache are
+            # read inline and never take up a worker.
+            futures = {}
+            executor = None
+            
+            if self.max_workers > 1:
+                misses = [
+                    i for i, batch_vars in enumerate(batches)
+                    if not self._is_data_cached(self._build_query(product_code, batch_vars))
+                ]
+                workers = min(self.max_workers, len(misses))
                 
-                # Show progress for each batch
-                if show_progress or self.debug:
-                    print(f"  🔄 Processing batch {batch_num}/{len(batches)}...", end="")
+                if workers > 1:
+                    executor = ThreadPoolExecutor(max_workers=workers)
+            
+            try:
+                if executor is not None:
+                    futures = {
+                        i: executor.submit(self._fetch_batch, product_code, batches[i])
+                        for i in misses
+                    }
                 
-                try:
-                    query = self._build_query(product_code, batch_vars)
-                    data = self._get_data(query)
-                    df = self._data_to_dataframe(data)
+                for i, batch_vars in enumerate(batches):
+                    batch_num = i + 1
                     
-                    if not df.empty:
-                        all_dataframes.append(df)
-                        batch_rows = len(df)
-                        total_rows += batch_rows
+                    # Show progress for each batch
+                    if show_progress or self.debug:
+                        print(f"  🔄 Processing batch {batch_num}/{len(batches)}...", end="")
+                    
+                    try:
+                        if i in futures:
+                            df = futures[i].result()
+                        else:
+                            df = self._fetch_batch(product_code, batch_vars)
                         
+                        if not df.empty:
+                            all_dataframes.append(df)
+                            batch_rows = len(df)
+                            total_rows += batch_rows
+                            
+                            if show_progress or self.debug:
+                                print(f" ✅ {batch_rows:,} rows")
+                        else:
+                            if show_progress or self.debug:
+                                print(" ⚠️  No data")
+                            elif self.debug:
+                                print(f"Batch {batch_num} returned no data")
+                                
+                    except Exception as e:
                         if show_progress or self.debug:
-                            print(f" ✅ {batch_rows:,} rows")
-                    else:
-                        if show_progress or self.debug:
-                            print(" ⚠️  No data")
+                            print(f" ❌ Error: {str(e)[:50]}...")
                         elif self.debug:
-                            print(f"Batch {batch_num} returned no data")
-                            
-                except Exception as e:
-                    if show_progress or self.debug:
-                        print(f" ❌ Error: {str(e)[:50]}...")
-                    elif self.debug:
-                        print(f"Batch {batch_num} failed: {e}")
-                    continue
+                            print(f"Batch {batch_num} failed: {e}")
+                        continue
+            finally:
+                if executor is not None:
+                    executor.shutdown()
             
             if not all_dataframes:
                 if show_progress or self.debug:
@@ -675,7 +1119,11 @@ class TrafikanalysClient:
             if show_progress or self.debug:
                 print(f"  🔗 Combining data from {len(all_dataframes)} successful batches...", end="")
             
-            result_df = pd.concat(all_dataframes, ignore_index=True)
+            # Batches share their columns, so there is nothing to sort or align
+            if len(all_dataframes) == 1:
+                result_df = all_dataframes[0]
+            else:
+                result_df = pd.concat(all_dataframes, ignore_index=True, sort=False)
             
             # Remove duplicates that might occur due to overlapping batches
             initial_rows = len(result_df)
@@ -691,6 +1139,9 @@ class TrafikanalysClient:
             elif self.debug:
                 print(f"Combined {len(batches)} batches into {final_rows} total rows")
             
+            if categorical:
+                result_df = self._to_categorical(result_df)
+            
             return result_df
         
         else:
@@ -712,6 +1163,9 @@ class TrafikanalysClient:
                 else:
                     print(" ⚠️  No data found")
             
+            if categorical:
+                result_df = self._to_categorical(result_df)
+            
             return result_df
     
     def clear_cache(self, older_than_seconds: Optional[int] = None) -> int:
@@ -724,8 +1178,21 @@ class TrafikanalysClient:
         Returns:
             Number of files deleted
         """
+        self.clear_memory_cache()
+        
         return self.cache.clear_cache(older_than_seconds)
     
+    def clear_memory_cache(self) -> None:
+        """
+        Clear the responses and lookups held in process memory, keeping the cache files.
+        """
+        self._hierarchy_paths.clear()
+        self._variable_options.clear()
+        self._products = None
+        self._product_haystack = None
+        self._available_values.clear()
+        self.cache.clear_memory()
+    
     def get_cache_info(self) -> Dict[str, Any]:
         """
         Get information about the cache.
@@ -735,6 +1202,18 @@ class TrafikanalysClient:
         """
         return self.cache.get_cache_info()
     
+    def close(self) -> None:
+        """
+        Close the HTTP session and its pooled connections.
+        """
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
 
 
     """
@@ -765,50 +1244,12 @@ class TrafikanalysClient:
                 print("No 'StructureItems' in API response")
             return pd.DataFrame()
         
-        def process_item(item, parent_hierarchy=None):
-            """Process an item and its children recursively."""
-            item_type = item.get('Type', '')
-            item_name = item.get('Name', '')
-            
-            # Process depending on type
-            if item_type == 'D':  # Variable
-                variables.append({
-                    'name': item_name,
-                    'label': item.get('Label', ''),
-                    'type': 'Variable',
-                    'description': item.get('Description', ''),
-                    'data_type': item.get('DataType', ''),
-                    'has_filter_options': True,
-                    'parent_hierarchy': parent_hierarchy
-                })
-            elif item_type == 'M':  # Measure
-                variables.append({
-                    'name': item_name,
-                    'label': item.get('Label', ''),
-                    'type': 'Measure',
-                    'description': item.get('Description', ''),
-                    'data_type': item.get('DataType', ''),
-                    'has_filter_options': False,
-                    'parent_hierarchy': parent_hierarchy
-                })
-            elif item_type == 'H':  # Hierarchy
-                # Add the hierarchy itself as a "group" type
-                variables.append({
-                    'name': item_name,
-                    'label': item.get('Label', ''),
-                    'type': 'Hierarchy',
-                    'description': item.get('Description', ''),
-                    'data_type': item.get('DataType', ''),
-                    'has_filter_options': False,
-                    'parent_hierarchy': parent_hierarchy
-                })
-                
-                # Process children of the hierarchy
-                if 'StructureItems' in item and item['StructureItems']:
-                    for child_item in item['StructureItems']:
-                        process_item(child_item, item_name)  # Pass current hierarchy as parent
+        # Index the structure so later variable lookups can reuse it
+        self._index_product_structure(product_code, data)
         
-        # Process both cases: When items are inside the product and when they're at top level
+        # Collect the top-level variable items: either inside the product item
+        # or at top level with our product code as parent
+        root_items = []
         for item in data['StructureItems']:
             # Check if this is our product
             if item.get('Name') == product_code and item.get('Type') == 'P':
@@ -816,13 +1257,45 @@ class TrafikanalysClient:
                     print(f"Found product: {item.get('Label')}")
                 
                 # Look for variables inside the product
-                if 'StructureItems' in item and item['StructureItems']:
-                    for var_item in item['StructureItems']:
-                        process_item(var_item)
+                children = item.get('StructureItems')
+                if children:
+                    root_items.extend(children)
                         
             # Also check for variables at top level (with our product code as parent)
             elif item.get('ParentName') == product_code:
-                process_item(item)
+                root_items.append(item)
+        
+        # Walk the items depth-first with an explicit stack (pushed in reverse to
+        # keep the original item order), descending only into hierarchies
+        stack = [(item, None) for item in reversed(root_items)]
+        item_types = self._ITEM_TYPES
+        
+        while stack:
+            item, parent_hierarchy = stack.pop()
+            item_type = item.get('Type', '')
+            
+            # Look up the label for the type; other item types are skipped
+            kind = item_types.get(item_type)
+            if kind is None:
+                continue
+            
+            item_name = item.get('Name', '')
+            type_label, has_filter_options = kind
+            variables.append({
+                'name': item_name,
+                'label': item.get('Label', ''),
+                'type': type_label,
+                'description': item.get('Description', ''),
+                'data_type': item.get('DataType', ''),
+                'has_filter_options': has_filter_options,
+                'parent_hierarchy': parent_hierarchy
+            })
+            
+            # Queue children of a hierarchy with the hierarchy as their parent
+            if item_type == 'H':
+                children = item.get('StructureItems')
+                if children:
+                    stack.extend((child_item, item_name) for child_item in reversed(children))
         
         if not variables and self.debug:
             print("No variables found for this product")
@@ -846,6 +1319,30 @@ class TrafikanalysClient:
         Returns:
             DataFrame with filter options (name, label, description)
         """
+        return pd.DataFrame(self._collect_variable_options(product_code, variable_name))
+    
+    def _collect_variable_options(self, product_code: str, variable_name: str) -> List[Dict]:
+        """
+        Collect the available filter options for a variable in a product.
+        
+        Args:
+            product_code: The product code (e.g., "t10011")
+            variable_name: The variable name (e.g., "ar" for year)
+            
+        Returns:
+            List of filter option dictionaries (name, label, description, option_type, unique_id)
+        """
+        # Options already included in an indexed product structure need no request
+        known_options = self._known_variable_options(product_code, variable_name)
+        if known_options is not None:
+            return known_options
+        
+        # Variables already known to be nested in a hierarchy need the full path,
+        # skip the direct request that would not find them
+        known_paths = self._known_hierarchy_paths(product_code)
+        if known_paths and variable_name in known_paths:
+            return self._collect_variable_options_hierarchical(product_code, variable_name)
+        
         # First try direct access to the variable (this works for most variables including those in hierarchies)
         direct_query = f"{product_code}|{variable_name}"
         
@@ -856,14 +1353,7 @@ class TrafikanalysClient:
         if self.debug:
             print(f"Making request to: {url}?query={direct_query}&lang={self.language}")
             
-        # Use cached request
-        data = cached_api_request(
-            cache=self.cache,
-            request_func=self._make_request,
-            url=url,
-            params=params,
-            debug=self.debug
-        )
+        data = self._request_structure(params)
         
         # Extract filter options from the structure
         filter_options = []
@@ -872,58 +1362,247 @@ class TrafikanalysClient:
             if self.debug:
                 print("No 'StructureItems' in direct API response, trying hierarchical approach")
             # If direct access fails, try the hierarchical approach
-            return self._explore_variable_options_hierarchical(product_code, variable_name)
+            return self._collect_variable_options_hierarchical(product_code, variable_name)
         
-        # First, try to find the variable in the top-level items
-        variable_found = False
+        # Find the variable at top level or inside the product item and hierarchies
+        item = self._find_variable_item(data['StructureItems'], variable_name)
         
-        for item in data['StructureItems']:
-            if item.get('Name') == variable_name:
-                variable_found = True
-                if self.debug:
-                    print(f"Found variable: {item.get('Label')}")
-                
-                if 'StructureItems' in item and item['StructureItems']:
-                    self._process_filter_options(item['StructureItems'], filter_options)
-                break
-        
-        # If not found in top-level, search inside the product item and hierarchies
-        if not variable_found:
-            # Recursive function to find variable in nested structure
-            def find_variable(items):
-                for item in items:
-                    if item.get('Name') == variable_name:
-                        if self.debug:
-                            print(f"Found variable: {item.get('Label')}")
-                        
-                        if 'StructureItems' in item and item['StructureItems']:
-                            self._process_filter_options(item['StructureItems'], filter_options)
-                        return True
-                    
-                    # Look in children
-                    if 'StructureItems' in item and item['StructureItems']:
-                        if find_variable(item['StructureItems']):
-                            return True
-                
-                return False
-            
-            for item in data['StructureItems']:
-                if 'StructureItems' in item and item['StructureItems']:
-                    if find_variable(item['StructureItems']):
-                        variable_found = True
-                        break
-        
-        if not variable_found:
+        if item is None:
             if self.debug:
                 print(f"Variable {variable_name} not found in direct API response, trying hierarchical approach")
             # If variable not found with direct approach, try hierarchical
-            return self._explore_variable_options_hierarchical(product_code, variable_name)
+            return self._collect_variable_options_hierarchical(product_code, variable_name)
+        
+        if self.debug:
+            print(f"Found variable: {item.get('Label')}")
+        
+        if item.get('StructureItems'):
+            self._process_filter_options(item['StructureItems'], filter_options)
         
         if not filter_options and self.debug:
             print("No filter options found for this variable")
         
-        return pd.DataFrame(filter_options)
+        return self._remember_variable_options(product_code, variable_name, params, filter_options)
+
+
+    def _structure_cache_key(self, params: Dict[str, Any]) -> str:
+        """
+        Get the cache key of a structure request.
+        
+        Args:
+            params: Request parameters
+            
+        Returns:
+            Cache key
+        """
+        return self.cache.generate_cache_key(f"{self.BASE_URL}/structure", params)
+
+    def _remember_variable_options(self, product_code: str, variable_name: str,
+                                   params: Dict[str, Any], filter_options: List[Dict]) -> List[Dict]:
+        """
+        Record the filter options found for a variable so later lookups need no request.
+        
+        Options are only kept while caching is enabled, and empty results not at all;
+        they are dropped once the structure response they came from expires.
+        
+        Args:
+            product_code: The product code
+            variable_name: The variable name
+            params: Parameters of the structure request the options came from
+            filter_options: Filter options found for the variable
+            
+        Returns:
+            The filter options, as a list the caller may modify
+        """
+        if not filter_options or not self.cache.enabled:
+            return filter_options
+        
+        entry = (self._structure_cache_key(params), filter_options)
+        self._variable_options.setdefault((product_code, self.language), {})[variable_name] = entry
+        return list(filter_options)
+
+    def _known_variable_options(self, product_code: str, variable_name: str) -> Optional[List[Dict]]:
+        """
+        Get the recorded filter options of a variable while their source is still cached.
+        
+        Args:
+            product_code: The product code
+            variable_name: The variable name
+            
+        Returns:
+            The filter options, as a list the caller may modify, or None if not known
+        """
+        known = self._variable_options.get((product_code, self.language))
+        entry = known.get(variable_name) if known else None
+        if entry is None:
+            return None
+        
+        cache_key, filter_options = entry
+        if not self.cache.is_cache_valid(cache_key):
+            known.pop(variable_name, None)
+            return None
+        
+        return list(filter_options)
+
+    def _known_hierarchy_paths(self, product_code: str) -> Optional[Dict[str, List[str]]]:
+        """
+        Get the indexed hierarchy paths of a product while its structure is still cached.
+        
+        Args:
+            product_code: The product code
+            
+        Returns:
+            Dictionary of hierarchy paths (see _get_hierarchy_paths), or None if not known
+        """
+        key = (product_code, self.language)
+        entry = self._hierarchy_paths.get(key)
+        if entry is None:
+            return None
+        
+        cache_key, paths = entry
+        if not self.cache.is_cache_valid(cache_key):
+            self._hierarchy_paths.pop(key, None)
+            return None
+        
+        return paths
+
+    def _find_variable_item(self, items: List[Dict], name: str) -> Optional[Dict]:
+        """
+        Find a variable item in a structure response.
+        
+        Top-level items take precedence; otherwise the nested items are searched.
+        
+        Args:
+            items: Top-level structure items of the response
+            name: Variable name to look for
+            
+        Returns:
+            The matching item, or None if not found
+        """
+        for item in items:
+            if item.get('Name') == name:
+                return item
+        
+        return self._find_nested_item(items, name)
 
+    def _find_nested_item(self, items: List[Dict], name: str) -> Optional[Dict]:
+        """
+        Find the first item with the given name below the given items.
+        
+        The children of the given items are searched depth-first in document
+        order with an explicit stack, stopping at the first match.
+        
+        Args:
+            items: List of structure items whose descendants are searched
+            name: Item name to look for
+            
+        Returns:
+            The matching item, or None if not found
+        """
+        stack = []
+        for item in reversed(items):
+            children = item.get('StructureItems')
+            if children:
+                stack.extend(reversed(children))
+        
+        while stack:
+            item = stack.pop()
+            if item.get('Name') == name:
+                return item
+            
+            # Look in children
+            children = item.get('StructureItems')
+            if children:
+                stack.extend(reversed(children))
+        
+        return None
+
+    def _get_hierarchy_paths(self, product_code: str) -> Dict[str, List[str]]:
+        """
+        Get the hierarchy paths of the variables and measures in a product.
+        
+        The product structure is fetched and indexed once while caching is enabled,
+        see _index_product_structure.
+        
+        Args:
+            product_code: The product code
+            
+        Returns:
+            Dictionary mapping each variable nested in a hierarchy to the list of
+            hierarchy names leading to it, from the top down
+        """
+        paths = self._known_hierarchy_paths(product_code)
+        if paths is not None:
+            return paths
+        
+        data = self._get_structure(query=product_code)
+        
+        if 'StructureItems' not in data:
+            return {}
+        
+        return self._index_product_structure(product_code, data)
+    
+    def _index_product_structure(self, product_code: str, data: Dict[str, Any]) -> Dict[str, List[str]]:
+        """
+        Index a product structure for later variable lookups.
+        
+        The structure is walked once, with an explicit stack. The hierarchy path of
+        every nested variable is recorded, as are the filter options of variables
+        whose values are already included in the product structure, so that looking
+        those up needs no further request. The index is only kept while caching is
+        enabled, per language, until the structure's cache entry expires.
+        
+        Args:
+            product_code: The product code
+            data: Structure response for the product
+            
+        Returns:
+            Dictionary mapping each variable nested in a hierarchy to the list of
+            hierarchy names leading to it, from the top down
+        """
+        stack = []
+        for item in data.get('StructureItems', []):
+            if item.get('Type') == 'P' and item.get('Name') == product_code:
+                children = item.get('StructureItems')
+                if children:
+                    stack = [(child, []) for child in reversed(children)]
+        
+        paths = {}
+        options = {}
+        variable_types = self._VARIABLE_TYPES
+        
+        while stack:
+            item, path = stack.pop()
+            item_type = item.get('Type', '')
+            item_name = item.get('Name', '')
+            children = item.get('StructureItems')
+            
+            if item_type in variable_types:
+                # Variables outside any hierarchy are reachable directly;
+                # the first occurrence wins
+                if path and item_name not in paths:
+                    paths[item_name] = path
+                
+                if item_name not in options and children:
+                    filter_options = []
+                    self._process_filter_options(children, filter_options)
+                    if filter_options:
+                        options[item_name] = filter_options
+            elif item_type == 'H':
+                # Add this hierarchy to the path and look in children
+                if children:
+                    new_path = path + [item_name]
+                    stack.extend((child, new_path) for child in reversed(children))
+        
+        if self.cache.enabled:
+            key = (product_code, self.language)
+            cache_key = self._structure_cache_key({"lang": self.language, "query": product_code})
+            self._hierarchy_paths[key] = (cache_key, paths)
+            known = self._variable_options.setdefault(key, {})
+            for name, filter_options in options.items():
+                known[name] = (cache_key, filter_options)
+        
+        return paths
 
     def _process_filter_options(self, items: List[Dict], filter_options: List[Dict]) -> None:
         """
@@ -933,89 +1612,72 @@ class TrafikanalysClient:
             items: List of filter option items
             filter_options: List to add filter options to
         """
+        option_types = self._OPTION_TYPES
+        append = filter_options.append
+        
         for option in items:
-            if option.get('Type') in ['DV', 'F']:  # DV = variable value, F = filter
-                filter_options.append({
+            option_type = option_types.get(option.get('Type'))
+            if option_type is not None:
+                append({
                     'name': option.get('Name', ''),
                     'label': option.get('Label', ''),
                     'description': option.get('Description', ''),
-                    'option_type': 'Filter' if option.get('Type') == 'F' else 'Value',
+                    'option_type': option_type,
                     'unique_id': option.get('UniqueId', '')
                 })
 
-    def preview_query(self, product_code: str, query_dict: Dict[str, Any]) -> str:
+    def preview_query(self, product_code: str, query_dict: Dict[str, Any],
+                      verbose: bool = True) -> str:
         """
         Preview the API query that would be generated from the provided parameters.
         
         Args:
             product_code: The product code (e.g., "t10011")
             query_dict: Dictionary with selected variables and filters
+            verbose: Whether to print the query URL and batching note
+                (False only builds and returns the query string)
             
         Returns:
             The API query string
         """
         query = self._build_query(product_code, query_dict)
         
-        print(f"\nAPI Query Preview:")
-        print(f"https://api.trafa.se/api/data?query={query}")
+        if not verbose:
+            return query
+        
+        preview = f"\nAPI Query Preview:\n{self.BASE_URL}/data?query={query}"
         
         # Check if batching would be needed
         if self._needs_batching(query_dict):
             batches = self._create_batches(query_dict)
-            print(f"\nNote: This query will be split into {len(batches)} batches due to size")
+            preview += f"\n\nNote: This query will be split into {len(batches)} batches due to size"
         
+        print(preview)
         return query
     
-    def _explore_variable_options_hierarchical(self, product_code: str, variable_name: str) -> pd.DataFrame:
+    def _collect_variable_options_hierarchical(self, product_code: str, variable_name: str) -> List[Dict]:
         """
-        Explore variable options using a hierarchical approach as fallback.
+        Collect variable options using a hierarchical approach as fallback.
         
         Args:
             product_code: The product code
             variable_name: The variable name
             
         Returns:
-            DataFrame with filter options
+            List of filter option dictionaries
         """
-        # First, check if this is part of a hierarchy by getting the product structure
-        data = self._get_structure(query=product_code)
-        
-        # Find hierarchy path to the variable
-        hierarchy_path = None
-        
-        def find_variable_in_structure(items, parent_path=None):
-            """Find a variable in the structure and return its hierarchy path."""
-            path = parent_path[:] if parent_path else []
-            
-            for item in items:
-                item_type = item.get('Type', '')
-                item_name = item.get('Name', '')
-                
-                if item_name == variable_name and item_type in ['D', 'M']:
-                    return path
-                
-                if item_type == 'H':
-                    # Add this hierarchy to the path
-                    new_path = path + [item_name]
-                    
-                    # Look in children
-                    if 'StructureItems' in item and item['StructureItems']:
-                        result = find_variable_in_structure(item['StructureItems'], new_path)
-                        if result:
-                            return result
-            
-            return None
+        # Find hierarchy path to the variable from the product structure
+        hierarchy_path = self._get_hierarchy_paths(product_code).get(variable_name)
         
-        if 'StructureItems' in data:
-            for item in data['StructureItems']:
-                if item.get('Type') == 'P' and item.get('Name') == product_code:
-                    if 'StructureItems' in item and item['StructureItems']:
-                        hierarchy_path = find_variable_in_structure(item['StructureItems'])
+        # Indexing the product structure may already have found the options
+        known_options = self._known_variable_options(product_code, variable_name)
+        if known_options is not None:
+            return known_options
         
         if not hierarchy_path:
             if self.debug:
                 print(f"No hierarchy path found for variable {variable_name}")
-            return pd.DataFrame()
+            return []
         
         # Build the query string based on hierarchy path
         query = product_code
@@ -1027,17 +1689,8 @@ class TrafikanalysClient:
             print(f"Using hierarchical query: {query}")
         
         # Get the structure for the product + hierarchy + variable
-        url = f"{self.BASE_URL}/structure"
         params = {"query": query, "lang": self.language}
-        
-        # Use cached request
-        data = cached_api_request(
-            cache=self.cache,
-            request_func=self._make_request,
-            url=url,
-            params=params,
-            debug=self.debug
-        )
+        data = self._request_structure(params)
         
         # Extract filter options from the structure
         filter_options = []
@@ -1045,53 +1698,24 @@ class TrafikanalysClient:
         if 'StructureItems' not in data:
             if self.debug:
                 print("No 'StructureItems' in hierarchical API response")
-            return pd.DataFrame()
+            return []
         
-        # First, try to find the variable in the top-level items
-        variable_found = False
+        item = self._find_variable_item(data['StructureItems'], variable_name)
         
-        for item in data['StructureItems']:
-            if item.get('Name') == variable_name:
-                variable_found = True
-                if self.debug:
-                    print(f"Found variable in hierarchical response: {item.get('Label')}")
-                
-                if 'StructureItems' in item and item['StructureItems']:
-                    self._process_filter_options(item['StructureItems'], filter_options)
-                break
-        
-        # If not found in top-level, search recursively
-        if not variable_found:
-            def find_variable(items):
-                for item in items:
-                    if item.get('Name') == variable_name:
-                        if self.debug:
-                            print(f"Found variable in hierarchical response: {item.get('Label')}")
-                        
-                        if 'StructureItems' in item and item['StructureItems']:
-                            self._process_filter_options(item['StructureItems'], filter_options)
-                        return True
-                    
-                    # Look in children
-                    if 'StructureItems' in item and item['StructureItems']:
-                        if find_variable(item['StructureItems']):
-                            return True
-                
-                return False
+        if item is None:
+            if self.debug:
+                print(f"Variable {variable_name} not found in hierarchical API response")
+        else:
+            if self.debug:
+                print(f"Found variable in hierarchical response: {item.get('Label')}")
             
-            for item in data['StructureItems']:
-                if 'StructureItems' in item and item['StructureItems']:
-                    if find_variable(item['StructureItems']):
-                        variable_found = True
-                        break
-        
-        if not variable_found and self.debug:
-            print(f"Variable {variable_name} not found in hierarchical API response")
+            if item.get('StructureItems'):
+                self._process_filter_options(item['StructureItems'], filter_options)
         
         if not filter_options and self.debug:
             print("No filter options found for this variable")
         
-        return pd.DataFrame(filter_options)
+        return self._remember_variable_options(product_code, variable_name, params, filter_options)
 
 
     """
@@ -1110,39 +1734,45 @@ class TrafikanalysClient:
         Returns:
             List of available values as strings
         """
-        # Get filter options for the variable
-        options_df = self.explore_variable_options(product_code, variable_name)
-        
-        if options_df.empty:
+        # Reuse the values while the structure response they came from is cached
+        key = (product_code, variable_name, exclude_totals, self.language)
+        entry = self._available_values.get(key)
+        if entry is not None:
+            cache_key, known_values = entry
+            if self.cache.is_cache_valid(cache_key):
+                return list(known_values)
+            self._available_values.pop(key, None)
+        
+        # Get filter options for the variable, without building a DataFrame
+        options = self._collect_variable_options(product_code, variable_name)
+        
+        if not options:
             if self.debug:
                 print(f"No options found for variable {variable_name} in product {product_code}")
             return []
         
-        # Extract values
-        values = []
-        for _, row in options_df.iterrows():
-            value_name = row['name']
-            
-            # Skip total values if requested
-            if exclude_totals and value_name in ['t1', 'totalt', 'total']:
-                continue
-                
-            # Skip special filter options for years
-            if variable_name == 'ar' and value_name in ['senaste', 'forra']:
-                continue
-                
-            values.append(value_name)
+        values = [option['name'] for option in options]
+        
+        # Skip total values if requested
+        if exclude_totals:
+            total_values = self._TOTAL_VALUES
+            values = [value for value in values if value not in total_values]
         
-        # Sort years in ascending order if this is the year variable
         if variable_name == 'ar':
-            # Filter to only numeric years and sort
-            numeric_years = [year for year in values if year.isdigit() and len(year) == 4]
-            numeric_years.sort()
-            values = numeric_years
+            # Keep only four-digit years (dropping filters such as 'senaste'),
+            # sorted in ascending order
+            values = sorted(value for value in values if len(value) == 4 and value.isdigit())
         
         if self.debug:
             print(f"Found {len(values)} available values for {variable_name} in {product_code}: {values}")
         
+        # The options were recorded with their source only if caching is enabled
+        known = self._variable_options.get((product_code, self.language))
+        source = known.get(variable_name) if known else None
+        if source is not None:
+            self._available_values[key] = (source[0], values)
+            return list(values)
+        
         return values
 
     def build_query(self, product_code: str, **kwargs) -> Dict[str, Union[str, List[str]]]:
@@ -1171,22 +1801,95 @@ class TrafikanalysClient:
                 nyregunder=''    # No filter (measure)
             )
         """
-        query_dict = {}
+        all_variables = [name for name, value_spec in kwargs.items() if value_spec == 'all']
+        
+        if len(all_variables) > 1:
+            # Fetch the values of several 'all' variables concurrently over the
+            # shared session instead of one round-trip after another
+            with ThreadPoolExecutor(max_workers=min(8, len(all_variables))) as executor:
+                results = executor.map(
+                    lambda name: self.get_all_available_values(product_code, name),
+                    all_variables
+                )
+                fetched = dict(zip(all_variables, results))
+        else:
+            fetched = {name: self.get_all_available_values(product_code, name) for name in all_variables}
+        
+        query_dict = {
+            name: fetched[name] if name in fetched else value_spec
+            for name, value_spec in kwargs.items()
+        }
         
-        for variable_name, value_spec in kwargs.items():
-            if value_spec == 'all':
-                query_dict[variable_name] = self.get_all_available_values(product_code, variable_name)
-            elif isinstance(value_spec, list):
-                query_dict[variable_name] = value_spec
+        if self.debug:
+            self._print_query_summary(query_dict)
+        
+        return query_dict
+
+    def _print_query_summary(self, query_dict: Dict[str, Union[str, List[str]]]) -> None:
+        """
+        Print a short summary of a built query.
+        
+        Args:
+            query_dict: Dictionary with query parameters
+        """
+        print("Built automated query:")
+        for key, value in query_dict.items():
+            if isinstance(value, list) and len(value) > 5:
+                print(f"  {key}: [{value[0]}, {value[1]}, ..., {value[-2]}, {value[-1]}] ({len(value)} values)")
             else:
-                query_dict[variable_name] = value_spec
+                print(f"  {key}: {value}")
+
+    async def a_get_all_available_values(self, product_code: str, variable_name: str,
+                                         exclude_totals: bool = True) -> List[str]:
+        """
+        Asynchronous version of get_all_available_values.
+        
+        The lookup runs in the event loop's default executor on the client's shared
+        session, so caching and rate limiting behave exactly as in the synchronous call.
+        
+        Args:
+            product_code: The product code (e.g., "t10026")
+            variable_name: The variable name (e.g., "ar", "drivmedel", "reglan")
+            exclude_totals: Whether to exclude total values like 't1'
+            
+        Returns:
+            List of available values as strings
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, partial(self.get_all_available_values, product_code, variable_name, exclude_totals)
+        )
+
+    async def a_build_query(self, product_code: str, **kwargs) -> Dict[str, Union[str, List[str]]]:
+        """
+        Asynchronous version of build_query.
+        
+        Values for all variables set to 'all' are fetched concurrently, so a query
+        with several 'all' variables takes roughly one round-trip instead of one per variable.
+        
+        Args:
+            product_code: The product code
+            **kwargs: Variable configurations, see build_query
+        
+        Returns:
+            Dictionary with query parameters
+        
+        Example:
+            query = await client.a_build_query("t10026", ar='all', drivmedel='all', nyregunder='')
+        """
+        all_variables = [name for name, value_spec in kwargs.items() if value_spec == 'all']
+        
+        results = await asyncio.gather(
+            *(self.a_get_all_available_values(product_code, name) for name in all_variables)
+        )
+        fetched = dict(zip(all_variables, results))
+        
+        query_dict = {
+            name: fetched[name] if name in fetched else value_spec
+            for name, value_spec in kwargs.items()
+        }
         
         if self.debug:
-            print("Built automated query:")
-            for key, value in query_dict.items():
-                if isinstance(value, list) and len(value) > 5:
-                    print(f"  {key}: [{value[0]}, {value[1]}, ..., {value[-2]}, {value[-1]}] ({len(value)} values)")
-                else:
-                    print(f"  {key}: {value}")
+            self._print_query_summary(query_dict)
         
         return query_dict
\ No newline at end of file